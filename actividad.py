@@ -0,0 +1,108 @@
+"""
+=============================================================================
+ACTIVIDAD DIARIA: series de tiempo de votos y comentarios
+=============================================================================
+
+Un gráfico de "actividad en el tiempo" tendría que recorrer votos_presupuesto y
+comentarios completos. actividad_diaria guarda por proyecto y día (UTC):
+likes y dislikes (votos nuevos), cambios (like <-> dislike) y comentarios.
+
+- Cada voto o comentario la actualiza en su misma transacción con un UPSERT
+  (INSERT ... ON CONFLICT DO UPDATE) de una sola fila.
+- Un comentario eliminado se descuenta del día en que se creó.
+- reconstruir(): `flask actividad-reconstruir` la rehace desde el historial. Solo
+  se guarda el tipo actual de cada voto: la reconstrucción cuenta cada voto con su
+  tipo actual en el día en que se emitió y no recupera los cambios (cambios = 0).
+- serie(): arrays compactos {'dias': [...], 'likes': [...], ...} solo con los
+  días que tuvieron actividad.
+- Al archivar un proyecto (archivo.py) sus filas se borran con él.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, text, update
+from sqlalchemy.dialects.sqlite import insert
+
+from extensions import db
+from models import ActividadDiaria
+
+CAMPOS = ('likes', 'dislikes', 'cambios', 'comentarios')
+
+
+def _sumar(presupuesto_id, **deltas):
+    """Suma deltas (positivos) a la fila de hoy del proyecto, creándola si no existe."""
+    stmt = insert(ActividadDiaria).values(
+        presupuesto_id=presupuesto_id,
+        dia=datetime.utcnow().date(),
+        **{campo: deltas.get(campo, 0) for campo in CAMPOS},
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['presupuesto_id', 'dia'],
+        set_={campo: getattr(ActividadDiaria, campo) + stmt.excluded[campo] for campo in deltas},
+    ))
+
+
+def registrar_voto(presupuesto_id, tipo_anterior, tipo_nuevo):
+    """Voto nuevo (suma likes o dislikes) o cambio de voto (suma cambios)."""
+    if tipo_anterior == tipo_nuevo:
+        return
+    if tipo_anterior is None:
+        _sumar(presupuesto_id, **{'likes' if tipo_nuevo == 'like' else 'dislikes': 1})
+    else:
+        _sumar(presupuesto_id, cambios=1)
+
+
+def registrar_comentario(presupuesto_id):
+    _sumar(presupuesto_id, comentarios=1)
+
+
+def quitar_comentarios(creados):
+    """
+    Descuenta comentarios eliminados del día en que se crearon.
+    creados: [(presupuesto_id, fecha_creacion)]. Una sentencia por (proyecto, día).
+    """
+    conteos = {}
+    for presupuesto_id, fecha in creados:
+        if fecha is not None:
+            clave = (presupuesto_id, fecha.date())
+            conteos[clave] = conteos.get(clave, 0) + 1
+    if not conteos:
+        return
+    t = ActividadDiaria.__table__
+    db.session.execute(
+        update(t)
+        .where(t.c.presupuesto_id == bindparam('pid'), t.c.dia == bindparam('d'))
+        .values(comentarios=func.max(t.c.comentarios - bindparam('n'), 0)),
+        [{'pid': pid, 'd': dia, 'n': n} for (pid, dia), n in conteos.items()],
+    )
+
+
+def reconstruir():
+    """Rehace actividad_diaria desde votos_presupuesto y comentarios (sin commit). Retorna filas creadas."""
+    db.session.execute(text('DELETE FROM actividad_diaria'))
+    return db.session.execute(text(
+        'INSERT INTO actividad_diaria (presupuesto_id, dia, likes, dislikes, cambios, comentarios)'
+        ' SELECT presupuesto_id, dia, SUM(likes), SUM(dislikes), 0, SUM(comentarios) FROM ('
+        "  SELECT presupuesto_id, date(fecha) AS dia, tipo = 'like' AS likes, tipo = 'dislike' AS dislikes,"
+        '   0 AS comentarios FROM votos_presupuesto WHERE fecha IS NOT NULL'
+        '  UNION ALL'
+        '  SELECT presupuesto_id, date(fecha_creacion), 0, 0, 1 FROM comentarios WHERE fecha_creacion IS NOT NULL'
+        ' ) GROUP BY presupuesto_id, dia'
+    )).rowcount
+
+
+def serie(desde, hasta, presupuesto_id=None):
+    """
+    {'desde', 'hasta', 'dias': [...], 'likes': [...], 'dislikes': [...], 'cambios': [...], 'comentarios': [...]}
+    de un proyecto, o de todos sumados si presupuesto_id es None.
+    """
+    a = ActividadDiaria
+    if presupuesto_id is None:
+        query = db.session.query(a.dia, *[func.sum(getattr(a, c)) for c in CAMPOS]).group_by(a.dia)
+    else:
+        query = db.session.query(a.dia, *[getattr(a, c) for c in CAMPOS]).filter(a.presupuesto_id == presupuesto_id)
+    filas = query.filter(a.dia >= desde, a.dia <= hasta).order_by(a.dia).all()
+    resultado = {'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'dias': [f[0].isoformat() for f in filas]}
+    for i, campo in enumerate(CAMPOS, start=1):
+        resultado[campo] = [f[i] for f in filas]
+    return resultado
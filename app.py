@@ -18,8 +18,11 @@ Gamificación: cantidad_gasto por presupuesto (solo al crear); Total Invertido e
 
 from datetime import datetime, date, timedelta
 from pathlib import Path
+import csv
+import io
 import os
 
+import click
 from dotenv import load_dotenv
 
 _env_path = Path(__file__).resolve().parent / '.env'
@@ -27,31 +30,63 @@ if not _env_path.exists():
     _env_path.write_text('SECRET_KEY=clave-secreta-cambiar-en-produccion\n', encoding='utf-8')
 load_dotenv(_env_path)
 
-from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Flask, Response, render_template, redirect, url_for, flash, request, abort, jsonify, send_from_directory, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_wtf.csrf import CSRFProtect
-from sqlalchemy import func
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+from sqlalchemy import Integer, and_, cast, delete, event, func, select, update
+from sqlalchemy.orm import load_only
 
 from config import Config
 from extensions import db, login_manager
-from models import Usuario, Presupuesto, Comentario, CarruselSlide, ContenidoSite, VotoPresupuesto
+from models import Usuario, Presupuesto, Categoria, Comentario, CarruselSlide, ContenidoSite, VotoPresupuesto, ResumenArchivo, ActividadDiaria
+import actividad
+import archivo
+import catalogo
+import categorias
+import correo
+import plantillas
+import publicador
+import reportes
+import respaldo
+import serializacion
+import tendencia
+import tiempo_real
 
 
 # =============================================================================
-# CONFIGURACIÓN - Dominios permitidos y categorías
+# CONFIGURACIÓN - Dominios permitidos
 # =============================================================================
 # Solo correos @alumnos.udg.mx y @academicos.udg.mx pueden registrarse e iniciar sesión.
+# Las categorías viven en la tabla categorias (ver categorias.py y /admin/categorias).
 DOMINIOS_PERMITIDOS = ('alumnos.udg.mx', 'academicos.udg.mx')
 
-CATEGORIAS = [
-    'Infraestructura',
-    'Equipamiento',
-    'Servicios',
-    'Material didáctico',
-    'Mantenimiento',
-    'Capacitación',
-    'Otros',
-]
+# Mayor id que cabe en un INTEGER de SQLite (64 bits con signo)
+ID_MAXIMO = 2 ** 63 - 1
+
+# Órdenes disponibles en el listado (?orden=...). 'likes' es el orden por defecto;
+# 'tendencia' usa hot_score (likes, dislikes, comentarios y recencia; ver tendencia.py).
+ORDENES = {
+    'likes': (Presupuesto.likes.desc(), Presupuesto.fecha.desc()),
+    'tendencia': (Presupuesto.hot_score.desc(), Presupuesto.fecha.desc()),
+}
+
+# Columnas que renderizan las cards (index y listado). descripcion (Text) queda diferida:
+# las plantillas usan resumen_card, precalculado al crear/editar.
+COLUMNAS_CARD = (
+    Presupuesto.id, Presupuesto.concepto, Presupuesto.resumen_card, Presupuesto.imagen_url,
+    Presupuesto.fecha, Presupuesto.categoria_id, Presupuesto.cantidad_gasto,
+    Presupuesto.likes, Presupuesto.dislikes,
+)
+
+
+def query_cards():
+    """Query de Presupuesto que solo carga las columnas de las cards."""
+    return Presupuesto.query.options(load_only(*COLUMNAS_CARD))
+
+
+def _activar_claves_foraneas(dbapi_conn, _registro):
+    """SQLite no aplica las FK por defecto: sin esto no hay ON DELETE CASCADE."""
+    dbapi_conn.execute('PRAGMA foreign_keys = ON')
 
 
 def create_app(config_class=Config):
@@ -62,6 +97,8 @@ def create_app(config_class=Config):
     """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    plantillas.init_app(app)
+    reportes.init_app(app)
 
     # -------------------------------------------------------------------------
     # Inicializar extensiones: SQLAlchemy, Flask-Login, CSRF
@@ -69,6 +106,16 @@ def create_app(config_class=Config):
     db.init_app(app)
     login_manager.init_app(app)
     CSRFProtect(app)
+    tiempo_real.init_app(app)
+    correo.enviador.init_app(app)
+    correo.barrido.init_app(app)
+    publicador.publicador.init_app(app)
+    respaldo.programado.init_app(app)
+    reportes.actualizador.init_app(app)
+    archivo.init_app(app)
+    with app.app_context():
+        if db.engine.url.get_backend_name() == 'sqlite':
+            event.listen(db.engine, 'connect', _activar_claves_foraneas)
 
     # -------------------------------------------------------------------------
     # Flask-Login: Callback para cargar usuario desde la base de datos.
@@ -124,11 +171,13 @@ def create_app(config_class=Config):
 
     # -------------------------------------------------------------------------
     # Context processor: total_invertido = suma real de cantidad_gasto (SQLAlchemy func.sum).
+    # Incluye lo acumulado de los años archivados (resumen_archivo) en la misma consulta.
     # Se muestra en la Navbar como "Total de Gastos" a la derecha con icono de dinero.
     # -------------------------------------------------------------------------
     @app.context_processor
     def inject_globals():
-        total = db.session.query(func.coalesce(func.sum(Presupuesto.cantidad_gasto), 0)).scalar()
+        archivado = db.session.query(func.coalesce(func.sum(ResumenArchivo.cantidad_gasto), 0)).scalar_subquery()
+        total = db.session.query(func.coalesce(func.sum(Presupuesto.cantidad_gasto), 0) + archivado).scalar()
         total_invertido = float(total) if total is not None else 0.0
         return {
             'current_year': datetime.now().year,
@@ -136,6 +185,24 @@ def create_app(config_class=Config):
             'total_invertido': total_invertido,
         }
 
+    # -------------------------------------------------------------------------
+    # Caché del navegador / service worker: las respuestas para usuarios con sesión
+    # (botones de admin, voto propio) no se guardan; sw.js respeta no-store.
+    # -------------------------------------------------------------------------
+    @app.after_request
+    def cache_por_sesion(response):
+        if current_user.is_authenticated and 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'private, no-store'
+        return response
+
+    @app.route('/sw.js')
+    def service_worker():
+        """Service worker servido desde la raíz para que su alcance sea todo el sitio."""
+        response = send_from_directory(os.path.join(app.static_folder, 'js'), 'sw.js', max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Service-Worker-Allowed'] = '/'
+        return response
+
     # =========================================================================
     # RUTAS PÚBLICAS - Accesibles sin autenticación
     # =========================================================================
@@ -173,8 +240,8 @@ def create_app(config_class=Config):
         # Imagen de fondo editable por Admin (clave index_fondo_url)
         fondo_url = get_content('index_fondo_url', 'https://images.unsplash.com/photo-1562774053-701939374585?w=1920&h=1080&fit=crop')
 
-        # Presupuestos ordenados de mayor a menor número de likes (gamificación)
-        presupuestos = Presupuesto.query.order_by(Presupuesto.likes.desc(), Presupuesto.fecha.desc()).limit(12).all()
+        # Presupuestos en tendencia (hot_score indexado): actividad reciente pesa más que likes antiguos
+        presupuestos = query_cards().order_by(*ORDENES['tendencia']).limit(12).all()
         return render_template(
             'index.html',
             presupuestos=presupuestos,
@@ -187,33 +254,64 @@ def create_app(config_class=Config):
     def presupuestos_lista():
         """
         Lista de proyectos presupuestarios en cuadrícula de cards.
-        Soporta filtros por categoría y año.
+        Soporta filtros por categoría y año, y orden por likes (defecto) o ?orden=tendencia.
+        Un año archivado (flask archivar) se lee también de la BD de archivo.
         Visitantes: solo lectura. Administradores: ven botón Agregar.
+        Una query no canónica (parámetros vacíos, orden=likes, otro orden de claves)
+        redirige a la URL canónica, que es la que publica el publicador estático.
         """
-        query = Presupuesto.query
-        categoria = request.args.get('categoria')
-        anio = request.args.get('anio')
-
-        if categoria:
-            query = query.filter(Presupuesto.categoria == categoria)
+        query = query_cards()
+        categoria, anio = _filtros_listado()
+
+        # Orden dinámico: likes (defecto) o tendencia (respeta filtros por categoría/año)
+        orden = request.args.get('orden', 'likes')
+        if orden not in ORDENES:
+            orden = 'likes'
+        canonica = publicador.url_listado(request.args.get('categoria') or None, anio, orden)
+        if canonica.partition('?')[2] != request.query_string.decode('latin-1'):
+            return redirect(canonica, code=301)
+
+        if categoria is not None:
+            query = query.filter(Presupuesto.categoria_id == categoria)
         if anio:
-            try:
-                anio_int = int(anio)
-                query = query.filter(
-                    Presupuesto.fecha >= date(anio_int, 1, 1),
-                    Presupuesto.fecha <= date(anio_int, 12, 31)
-                )
-            except ValueError:
-                pass
+            query = query.filter(*catalogo.filtro_anio(anio))
 
-        # Orden dinámico: mayor a menor número de likes (respeta filtros por categoría/año)
-        presupuestos = query.order_by(Presupuesto.likes.desc(), Presupuesto.fecha.desc()).all()
+        presupuestos = query.order_by(*ORDENES[orden]).all()
+        if anio and archivo.anio_archivado(anio):
+            archivados = archivo.listar(COLUMNAS_CARD, categoria, anio, ORDENES[orden])
+            presupuestos = archivo.combinar(presupuestos, archivados, ORDENES[orden])
         return render_template(
             'presupuestos.html',
             presupuestos=presupuestos,
-            categorias=CATEGORIAS,
+            categorias=categorias.nombres(),
+            orden=orden,
+            facetas=catalogo.facetas(categorias.todas(), categoria, anio),
         )
 
+    @app.route('/api/presupuestos/facetas')
+    def api_presupuestos_facetas():
+        """
+        Facetas del listado en JSON: proyectos y monto total por categoría (respetando ?anio)
+        y por año (respetando ?categoria). En caché hasta que cambia el catálogo.
+        """
+        categoria, anio = _filtros_listado()
+        return jsonify(catalogo.facetas(categorias.todas(), categoria, anio))
+
+    def _filtros_listado():
+        """
+        (categoria_id, anio) desde la query string (?categoria=<nombre>&anio=).
+        Categoría inexistente -> 0 (ningún proyecto); anio=None si no es un entero válido.
+        """
+        nombre = request.args.get('categoria') or None
+        categoria = (categorias.id_de(nombre) or 0) if nombre else None
+        try:
+            anio = int(request.args.get('anio', ''))
+        except ValueError:
+            anio = None
+        if anio is not None and not 1 <= anio <= 9999:
+            anio = None
+        return categoria, anio
+
     @app.route('/presupuesto/<int:id>')
     def presupuesto_detalle(id):
         """
@@ -221,9 +319,21 @@ def create_app(config_class=Config):
         Muestra imagen, título, resumen, monto y categoría.
         Administradores ven botones Editar y Eliminar.
         """
-        presupuesto = Presupuesto.query.get_or_404(id)
+        presupuesto = db.session.get(Presupuesto, id)
+        if presupuesto is None:
+            if archivo.obtener(id) is None:
+                abort(404)
+            return redirect(url_for('presupuesto_archivado', id=id), code=301)
         return render_template('presupuesto/detalle.html', presupuesto=presupuesto)
 
+    @app.route('/archivo/presupuesto/<int:id>')
+    def presupuesto_archivado(id):
+        """Detalle (solo lectura) de un proyecto de un año archivado."""
+        presupuesto = archivo.obtener(id)
+        if presupuesto is None:
+            abort(404)
+        return render_template('presupuesto/detalle.html', presupuesto=presupuesto, archivado=True)
+
     # -------------------------------------------------------------------------
     # API para el modal de detalle (Index): datos JSON, like, dislike, comentarios
     # El modal bloquea el scroll del fondo y tiene scroll interno.
@@ -243,39 +353,103 @@ def create_app(config_class=Config):
         presupuesto.likes = likes
         presupuesto.dislikes = dislikes
 
+    def _recontar_votos(ids):
+        """Como _recalcular_likes_dislikes, para varios proyectos en una sola sentencia UPDATE."""
+        if not ids:
+            return
+
+        def conteo(tipo):
+            return (
+                select(func.count())
+                .where(VotoPresupuesto.presupuesto_id == Presupuesto.id, VotoPresupuesto.tipo == tipo)
+                .scalar_subquery()
+            )
+
+        db.session.execute(
+            update(Presupuesto).where(Presupuesto.id.in_(ids)).values(likes=conteo('like'), dislikes=conteo('dislike'))
+        )
+
     @app.route('/api/presupuesto/<int:id>')
     def api_presupuesto_detalle(id):
         """
         Retorna JSON con detalle del presupuesto para el modal.
         Incluye comentarios (con id para que Admin pueda eliminar) y cantidad_gasto.
+        ?campos=id,concepto,likes limita las claves (y las columnas consultadas).
         """
-        presupuesto = Presupuesto.query.get_or_404(id)
-        comentarios = [
-            {'id': c.id, 'autor': c.autor or 'Anónimo', 'contenido': c.contenido, 'fecha': c.fecha_creacion.isoformat() if c.fecha_creacion else ''}
-            for c in presupuesto.comentarios.all()
-        ]
-        # Estado de voto del usuario actual (para mostrar like/dislike activo)
-        mi_voto = None
-        if current_user.is_authenticated:
-            v = VotoPresupuesto.query.filter_by(usuario_id=current_user.id, presupuesto_id=presupuesto.id).first()
-            if v:
-                mi_voto = v.tipo
-        return jsonify({
-            'id': presupuesto.id,
-            'concepto': presupuesto.concepto,
-            'descripcion': presupuesto.descripcion or '',
-            'descripcion_corta': presupuesto.descripcion_corta or (presupuesto.descripcion[:80] + '...' if presupuesto.descripcion and len(presupuesto.descripcion) > 80 else (presupuesto.descripcion or '')),
-            'imagen_url': presupuesto.imagen_url or '',
-            'fecha': presupuesto.fecha.isoformat() if presupuesto.fecha else '',
-            'categoria': presupuesto.categoria,
-            'monto': presupuesto.monto,
-            'cantidad_gasto': getattr(presupuesto, 'cantidad_gasto', 0) or 0,
-            'likes': presupuesto.likes or 0,
-            'dislikes': presupuesto.dislikes or 0,
-            'mi_voto': mi_voto,
-            'comentarios': comentarios,
-            'es_admin': current_user.is_authenticated and current_user.es_administrador,
-        })
+        campos = _campos_detalle()
+        if campos is None:
+            return _error_campos()
+        detalles = _detalles([id], campos)
+        if not detalles:
+            abort(404)
+        return serializacion.responder(detalles[0])
+
+    @app.route('/api/presupuestos/lote')
+    def api_presupuestos_lote():
+        """
+        Detalle de varios presupuestos en una sola respuesta (?ids=1,2,3; máximo 50),
+        con el mismo formato que /api/presupuesto/<id> (también acepta ?campos=). Sirve
+        para precargar las cards visibles y abrir el modal sin otra petición.
+        """
+        ids = _ids_desde_query('ids')
+        if ids is None:
+            return jsonify({'error': 'Indica entre 1 y 50 ids de proyecto.'}), 400
+        campos = _campos_detalle()
+        if campos is None:
+            return _error_campos()
+        return serializacion.responder({'presupuestos': _detalles(ids, campos)})
+
+    def _ids_desde_query(nombre, maximo=50):
+        """Lista de ids enteros únicos desde ?nombre=1,2,3 (en orden); None si está vacía o excede maximo."""
+        ids = {}
+        for parte in request.args.get(nombre, '').split(','):
+            n = _id_valido(parte)
+            if n is not None:
+                ids[n] = None
+        if not ids or len(ids) > maximo:
+            return None
+        return list(ids)
+
+    def _campos_detalle():
+        """Campos pedidos en ?campos= (todos por defecto); None si alguno no existe."""
+        try:
+            return serializacion.campos_pedidos(request.args.get('campos'))
+        except ValueError:
+            return None
+
+    def _error_campos():
+        return jsonify({'error': 'Campos válidos: ' + ','.join(serializacion.TODOS_PRESUPUESTO)}), 400
+
+    def _detalles(ids, campos):
+        """
+        Datos de card/modal (formato de /api/presupuesto/<id>) de los ids existentes, en ese orden.
+        Consultas fijas con IN y columnas proyectadas (serializacion.py): presupuestos y, solo
+        si se piden, comentarios y votos del usuario actual.
+        """
+        filas = serializacion.presupuestos(ids, campos)
+        encontrados = [pid for pid in ids if pid in filas]
+        if not encontrados:
+            return []
+        comentarios = serializacion.comentarios(encontrados) if 'comentarios' in campos else {}
+        mis_votos = {}
+        if 'mi_voto' in campos and current_user.is_authenticated:
+            mis_votos = dict(
+                db.session.query(VotoPresupuesto.presupuesto_id, VotoPresupuesto.tipo)
+                .filter(VotoPresupuesto.usuario_id == current_user.id, VotoPresupuesto.presupuesto_id.in_(encontrados))
+                .all()
+            )
+        es_admin = current_user.is_authenticated and current_user.es_administrador
+        detalles = []
+        for pid in encontrados:
+            datos = serializacion.presupuesto_dict(filas[pid], campos)
+            if 'mi_voto' in campos:
+                datos['mi_voto'] = mis_votos.get(pid)
+            if 'comentarios' in campos:
+                datos['comentarios'] = comentarios[pid]
+            if 'es_admin' in campos:
+                datos['es_admin'] = es_admin
+            detalles.append(datos)
+        return detalles
 
     @app.route('/api/presupuesto/<int:id>/like', methods=['POST'])
     @login_required
@@ -286,12 +460,20 @@ def create_app(config_class=Config):
         """
         presupuesto = Presupuesto.query.get_or_404(id)
         voto = VotoPresupuesto.query.filter_by(usuario_id=current_user.id, presupuesto_id=presupuesto.id).first()
+        tipo_anterior = voto.tipo if voto else None
+        fecha_anterior = voto.fecha if voto else None
         if voto:
-            voto.tipo = 'like'
+            if voto.tipo != 'like':
+                # El voto cambiado cuenta desde ahora (tendencia.recalcular lo decae desde aquí)
+                voto.tipo, voto.fecha = 'like', datetime.utcnow()
         else:
             db.session.add(VotoPresupuesto(usuario_id=current_user.id, presupuesto_id=presupuesto.id, tipo='like'))
         _recalcular_likes_dislikes(presupuesto)
+        tendencia.registrar_voto(presupuesto, tipo_anterior, 'like', fecha_anterior)
+        actividad.registrar_voto(presupuesto.id, tipo_anterior, 'like')
         db.session.commit()
+        tiempo_real.publicar_voto(presupuesto)
+        publicador.encolar_presupuesto(presupuesto)
         return jsonify({'likes': presupuesto.likes, 'dislikes': presupuesto.dislikes})
 
     @app.route('/api/presupuesto/<int:id>/dislike', methods=['POST'])
@@ -300,14 +482,83 @@ def create_app(config_class=Config):
         """Registra dislike; un voto por usuario (ver comentario en api_presupuesto_like)."""
         presupuesto = Presupuesto.query.get_or_404(id)
         voto = VotoPresupuesto.query.filter_by(usuario_id=current_user.id, presupuesto_id=presupuesto.id).first()
+        tipo_anterior = voto.tipo if voto else None
+        fecha_anterior = voto.fecha if voto else None
         if voto:
-            voto.tipo = 'dislike'
+            if voto.tipo != 'dislike':
+                # El voto cambiado cuenta desde ahora (tendencia.recalcular lo decae desde aquí)
+                voto.tipo, voto.fecha = 'dislike', datetime.utcnow()
         else:
             db.session.add(VotoPresupuesto(usuario_id=current_user.id, presupuesto_id=presupuesto.id, tipo='dislike'))
         _recalcular_likes_dislikes(presupuesto)
+        tendencia.registrar_voto(presupuesto, tipo_anterior, 'dislike', fecha_anterior)
+        actividad.registrar_voto(presupuesto.id, tipo_anterior, 'dislike')
         db.session.commit()
+        tiempo_real.publicar_voto(presupuesto)
+        publicador.encolar_presupuesto(presupuesto)
         return jsonify({'likes': presupuesto.likes, 'dislikes': presupuesto.dislikes})
 
+    @app.route('/api/csrf')
+    def api_csrf():
+        """Token CSRF para páginas servidas desde el publicador estático (meta csrf-token vacía)."""
+        return jsonify({'csrf_token': generate_csrf()})
+
+    @app.route('/api/catalogo/version')
+    def api_catalogo_version():
+        """Versión del catálogo; el service worker vacía su caché de datos cuando cambia."""
+        response = jsonify({'version': catalogo.version()})
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _rango_actividad():
+        """(desde, hasta) de los últimos ?dias=N días (por defecto ACTIVIDAD_DIAS, máximo ACTIVIDAD_DIAS_MAX)."""
+        dias = request.args.get('dias', app.config['ACTIVIDAD_DIAS'], type=int)
+        dias = max(1, min(dias, app.config['ACTIVIDAD_DIAS_MAX']))
+        hasta = datetime.utcnow().date()
+        return hasta - timedelta(days=dias - 1), hasta
+
+    def _respuesta_actividad(datos):
+        response = serializacion.responder(datos)
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response
+
+    @app.route('/api/presupuesto/<int:id>/actividad')
+    def api_presupuesto_actividad(id):
+        """Serie diaria de votos, cambios de voto y comentarios de un proyecto (arrays compactos, ver actividad.py)."""
+        if not db.session.query(Presupuesto.query.filter_by(id=id).exists()).scalar():
+            abort(404)
+        desde, hasta = _rango_actividad()
+        return _respuesta_actividad({'id': id, **actividad.serie(desde, hasta, presupuesto_id=id)})
+
+    @app.route('/api/actividad')
+    def api_actividad():
+        """Serie diaria de todo el catálogo (suma de todos los proyectos)."""
+        desde, hasta = _rango_actividad()
+        return _respuesta_actividad(actividad.serie(desde, hasta))
+
+    @app.route('/api/stream')
+    def api_stream():
+        """
+        Server-Sent Events: deltas de votos y comentarios nuevos/eliminados de los
+        proyectos indicados en ?ids=1,2,3 (máximo 50). 503 si se alcanzó el límite
+        de conexiones; EventSource reintenta solo.
+        """
+        ids = _ids_desde_query('ids')
+        if ids is None:
+            return jsonify({'error': 'Indica entre 1 y 50 ids de proyecto.'}), 400
+        suscripcion = tiempo_real.suscribir(ids)
+        if suscripcion is None:
+            return jsonify({'error': 'Demasiadas conexiones en tiempo real.'}), 503, {'Retry-After': '30'}
+        flujo = tiempo_real.flujo(
+            suscripcion,
+            heartbeat=app.config['SSE_HEARTBEAT_SEGUNDOS'],
+            duracion_max=app.config['SSE_DURACION_MAX_SEGUNDOS'],
+        )
+        return Response(stream_with_context(flujo), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
     @app.route('/api/comentario/<int:id>/eliminar', methods=['POST'])
     @login_required
     def api_comentario_eliminar(id):
@@ -318,8 +569,13 @@ def create_app(config_class=Config):
             abort(403)
         c = Comentario.query.get_or_404(id)
         presupuesto_id = c.presupuesto_id
+        presupuesto = c.presupuesto
         db.session.delete(c)
+        tendencia.registrar_comentario(presupuesto_id, signo=-1, fecha=c.fecha_creacion)
+        actividad.quitar_comentarios([(presupuesto_id, c.fecha_creacion)])
         db.session.commit()
+        tiempo_real.publicar_comentario_eliminado(presupuesto_id, id)
+        publicador.encolar_presupuesto(presupuesto)
         return jsonify({'ok': True, 'presupuesto_id': presupuesto_id})
 
     @app.route('/api/presupuesto/<int:id>/comentarios', methods=['POST'])
@@ -341,7 +597,11 @@ def create_app(config_class=Config):
             return jsonify({'error': 'El comentario no puede estar vacío.'}), 400
         c = Comentario(presupuesto_id=presupuesto.id, autor=autor, contenido=contenido)
         db.session.add(c)
+        tendencia.registrar_comentario(presupuesto.id)
+        actividad.registrar_comentario(presupuesto.id)
         db.session.commit()
+        tiempo_real.publicar_comentario(c)
+        publicador.encolar_presupuesto(presupuesto)
         return jsonify({
             'id': c.id,
             'autor': c.autor,
@@ -417,6 +677,13 @@ def create_app(config_class=Config):
             )
             usuario.set_password(password)
             db.session.add(usuario)
+            if app.config['MAIL_COLA_ACTIVA']:
+                # Se envía en segundo plano (cola persistente): el registro no espera al SMTP
+                correo.encolar(
+                    usuario.email,
+                    'Bienvenido a Transparencia Presupuestaria CUCEA',
+                    f'Hola {usuario.nombre}:\n\nTu cuenta fue creada correctamente.\n',
+                )
             db.session.commit()
 
             login_user(usuario)
@@ -449,16 +716,16 @@ def create_app(config_class=Config):
         if request.method == 'POST':
             concepto = request.form.get('concepto', '').strip()
             monto = request.form.get('monto')
-            categoria = request.form.get('categoria', '').strip()
+            categoria_id = request.form.get('categoria_id', type=int)
             fecha_str = request.form.get('fecha')
             descripcion_corta = request.form.get('descripcion_corta', '').strip() or None
             descripcion = request.form.get('descripcion', '').strip() or None
             imagen_url = request.form.get('imagen_url', '').strip() or None
             cantidad_gasto = request.form.get('cantidad_gasto')
 
-            if not concepto or not monto or not categoria or not fecha_str:
+            if not concepto or not monto or not categorias.nombre(categoria_id) or not fecha_str:
                 flash('Completa todos los campos obligatorios.', 'error')
-                return render_template('presupuesto/formulario.html', presupuesto=None, categorias=CATEGORIAS)
+                return render_template('presupuesto/formulario.html', presupuesto=None, categorias=categorias.todas())
 
             try:
                 fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
@@ -466,25 +733,29 @@ def create_app(config_class=Config):
                 cantidad_gasto_val = float(cantidad_gasto) if cantidad_gasto else 0
             except (ValueError, TypeError):
                 flash('Datos inválidos.', 'error')
-                return render_template('presupuesto/formulario.html', presupuesto=None, categorias=CATEGORIAS)
+                return render_template('presupuesto/formulario.html', presupuesto=None, categorias=categorias.todas())
 
             # cantidad_gasto solo se define al crear; después no es editable (integridad del presupuesto).
             p = Presupuesto(
                 concepto=concepto,
                 monto=monto_val,
-                categoria=categoria,
+                categoria_id=categoria_id,
                 fecha=fecha,
                 descripcion_corta=descripcion_corta,
                 descripcion=descripcion or None,
                 imagen_url=imagen_url,
                 cantidad_gasto=cantidad_gasto_val,
+                hot_score=tendencia.peso_inicial(),
             )
+            p.actualizar_resumen()
             db.session.add(p)
+            catalogo.incrementar()
             db.session.commit()
+            publicador.encolar_todo()
             flash('Proyecto guardado correctamente.', 'success')
             return redirect(url_for('presupuestos_lista'))
 
-        return render_template('presupuesto/formulario.html', presupuesto=None, categorias=CATEGORIAS)
+        return render_template('presupuesto/formulario.html', presupuesto=None, categorias=categorias.todas())
 
     @app.route('/presupuesto/editar/<int:id>', methods=['GET', 'POST'])
     @login_required
@@ -498,8 +769,11 @@ def create_app(config_class=Config):
         presupuesto = Presupuesto.query.get_or_404(id)
 
         if request.method == 'POST':
+            anteriores = publicador.urls_de([presupuesto])  # Por si cambia de categoría o de año
             presupuesto.concepto = request.form.get('concepto', '').strip()
-            presupuesto.categoria = request.form.get('categoria', '').strip()
+            categoria_id = request.form.get('categoria_id', type=int)
+            if categorias.nombre(categoria_id):
+                presupuesto.categoria_id = categoria_id
             presupuesto.descripcion_corta = request.form.get('descripcion_corta', '').strip() or None
             presupuesto.descripcion = request.form.get('descripcion', '').strip() or None
             presupuesto.imagen_url = request.form.get('imagen_url', '').strip() or None
@@ -509,12 +783,15 @@ def create_app(config_class=Config):
                 presupuesto.fecha = datetime.strptime(request.form.get('fecha', ''), '%Y-%m-%d').date()
             except (ValueError, TypeError):
                 flash('Datos inválidos.', 'error')
-                return render_template('presupuesto/formulario.html', presupuesto=presupuesto, categorias=CATEGORIAS)
+                return render_template('presupuesto/formulario.html', presupuesto=presupuesto, categorias=categorias.todas())
+            presupuesto.actualizar_resumen()
+            catalogo.incrementar()
             db.session.commit()
+            publicador.encolar_bajas(anteriores)
             flash('Proyecto actualizado.', 'success')
             return redirect(url_for('presupuesto_detalle', id=presupuesto.id))
 
-        return render_template('presupuesto/formulario.html', presupuesto=presupuesto, categorias=CATEGORIAS)
+        return render_template('presupuesto/formulario.html', presupuesto=presupuesto, categorias=categorias.todas())
 
     @app.route('/presupuesto/eliminar/<int:id>', methods=['POST'])
     @login_required
@@ -522,8 +799,11 @@ def create_app(config_class=Config):
     def presupuesto_eliminar(id):
         """Eliminar proyecto. Solo @alumnos.udg.mx; 403 si no."""
         presupuesto = Presupuesto.query.get_or_404(id)
+        anteriores = publicador.urls_de([presupuesto])
         db.session.delete(presupuesto)
+        catalogo.incrementar()
         db.session.commit()
+        publicador.encolar_bajas(anteriores)
         flash('Proyecto eliminado.', 'info')
         return redirect(url_for('presupuestos_lista'))
 
@@ -541,11 +821,209 @@ def create_app(config_class=Config):
         Usado desde el botón Borrar en cards y detalle.
         """
         presupuesto = Presupuesto.query.get_or_404(id)
+        anteriores = publicador.urls_de([presupuesto])
         db.session.delete(presupuesto)
+        catalogo.incrementar()
         db.session.commit()
+        publicador.encolar_bajas(anteriores)
         flash('Presupuesto eliminado correctamente.', 'info')
         return redirect(url_for('presupuestos_lista'))
 
+    # -------------------------------------------------------------------------
+    # Operaciones en lote (limpieza tras spam, reorganización de categorías).
+    # Una transacción y una sentencia por acción; votos y comentarios de los
+    # proyectos borrados caen por ON DELETE CASCADE. Las cachés derivadas
+    # (versión del catálogo, hot_score, publicador) se actualizan una vez por lote.
+    # Body JSON o form; ids como lista o "1,2,3" (máximo ADMIN_LOTE_MAX).
+    # -------------------------------------------------------------------------
+    def _id_valido(valor):
+        """
+        Id entero positivo desde un str/int del body o la query; None si no lo es ('²', '١', '1.5',
+        True...) o si no cabe en un INTEGER de SQLite (la consulta fallaría con OverflowError).
+        """
+        if isinstance(valor, str):
+            valor = valor.strip()
+            # int() acepta dígitos de otros sistemas ('١'): solo ASCII
+            if not (valor.isascii() and valor.isdigit()):
+                return None
+        elif isinstance(valor, bool) or not isinstance(valor, int):
+            return None
+        n = int(valor)
+        return n if 0 < n <= ID_MAXIMO else None
+
+    def _datos_lote():
+        """(datos, ids) del body; ids (conjunto) es None si falta, no es válido o excede ADMIN_LOTE_MAX."""
+        if request.is_json:
+            datos = request.get_json(silent=True)
+            datos = datos if isinstance(datos, dict) else {}
+            valor = datos.get('ids')
+            if isinstance(valor, str):
+                valor = valor.split(',')
+        else:
+            # ids=1&ids=2 (checkboxes) y/o ids=1,2
+            datos = request.form.to_dict()
+            valor = [v for campo in request.form.getlist('ids') for v in campo.split(',')]
+        ids = set()
+        for v in valor if isinstance(valor, list) else []:
+            n = _id_valido(v)
+            if n is None:
+                return datos, None
+            ids.add(n)
+        if len(ids) > app.config['ADMIN_LOTE_MAX']:
+            return datos, None
+        return datos, ids
+
+    @app.route('/admin/presupuestos/lote', methods=['POST'])
+    @login_required
+    @admin_required
+    def admin_presupuestos_lote():
+        """
+        accion=eliminar: borra los proyectos ids (con sus votos y comentarios).
+        accion=categoria: mueve los proyectos ids a categoria_id.
+        Retorna {'ok', 'accion', 'afectados'}.
+        """
+        datos, ids = _datos_lote()
+        accion = datos.get('accion')
+        if not ids:
+            return jsonify({'error': f"Indica entre 1 y {app.config['ADMIN_LOTE_MAX']} ids de proyecto."}), 400
+        # URLs publicadas antes del cambio: páginas que desaparecen y listados que pierden proyectos
+        anteriores = publicador.urls_de(
+            db.session.query(Presupuesto.id, Presupuesto.categoria_id, Presupuesto.fecha).filter(Presupuesto.id.in_(ids))
+        )
+        if accion == 'eliminar':
+            afectados = db.session.execute(delete(Presupuesto).where(Presupuesto.id.in_(ids))).rowcount
+        elif accion == 'categoria':
+            try:
+                categoria_id = int(datos.get('categoria_id'))
+            except (TypeError, ValueError):
+                categoria_id = None
+            if not categorias.nombre(categoria_id):
+                return jsonify({'error': 'Categoría no válida.'}), 400
+            afectados = db.session.execute(
+                update(Presupuesto)
+                .where(Presupuesto.id.in_(ids), Presupuesto.categoria_id != categoria_id)
+                .values(categoria_id=categoria_id)
+            ).rowcount
+        else:
+            return jsonify({'error': 'Acción no válida (eliminar o categoria).'}), 400
+        if afectados:
+            catalogo.incrementar()
+        db.session.commit()
+        if afectados:
+            publicador.encolar_bajas(anteriores)
+        return jsonify({'ok': True, 'accion': accion, 'afectados': afectados})
+
+    @app.route('/admin/comentarios/lote', methods=['POST'])
+    @login_required
+    @admin_required
+    def admin_comentarios_lote():
+        """
+        Moderación: elimina los comentarios ids y/o todos los de un autor (opcionalmente
+        solo de presupuesto_id). Retorna {'ok', 'eliminados', 'presupuestos'}.
+        """
+        datos, ids = _datos_lote()
+        autor = datos.get('autor')
+        autor = autor.strip() if isinstance(autor, str) else ''
+        if ids is None or not (ids or autor):
+            return jsonify({'error': f"Indica ids (máximo {app.config['ADMIN_LOTE_MAX']}) o un autor."}), 400
+        filtro = []
+        if ids:
+            filtro.append(Comentario.id.in_(ids))
+        if autor:
+            filtro.append(Comentario.autor == autor)
+        if datos.get('presupuesto_id') not in (None, ''):
+            # Un presupuesto_id inválido no se ignora: ampliaría el borrado a todos los proyectos
+            presupuesto_id = _id_valido(datos['presupuesto_id'])
+            if presupuesto_id is None:
+                return jsonify({'error': 'presupuesto_id no válido.'}), 400
+            filtro.append(Comentario.presupuesto_id == presupuesto_id)
+
+        por_presupuesto, creados = {}, []
+        for cid, pid, fecha in db.session.execute(
+            select(Comentario.id, Comentario.presupuesto_id, Comentario.fecha_creacion).where(*filtro)
+        ):
+            por_presupuesto.setdefault(pid, []).append(cid)
+            creados.append((pid, fecha))
+        eliminados = len(creados)
+        if eliminados:
+            db.session.execute(delete(Comentario).where(Comentario.id.in_([c for cs in por_presupuesto.values() for c in cs])))
+            tendencia.quitar_comentarios(creados)
+            actividad.quitar_comentarios(creados)
+        db.session.commit()
+        for pid, cids in por_presupuesto.items():
+            tiempo_real.publicar_comentarios_eliminados(pid, cids)
+        if por_presupuesto:
+            for p in query_cards().filter(Presupuesto.id.in_(por_presupuesto)):
+                publicador.encolar_presupuesto(p)
+        return jsonify({'ok': True, 'eliminados': eliminados, 'presupuestos': sorted(por_presupuesto)})
+
+    # -------------------------------------------------------------------------
+    # Reportes y exportaciones: se leen de la instantánea de solo lectura
+    # (reportes.py), nunca de la BD en vivo. Cabecera X-Reporte-Generado.
+    # -------------------------------------------------------------------------
+    @app.route('/api/reportes/resumen')
+    @login_required
+    @admin_required
+    @reportes.ruta
+    def api_reportes_resumen():
+        """Totales por año y categoría (incluye años archivados): proyectos, monto, gasto, likes, dislikes y comentarios."""
+        p, c = reportes.tabla('presupuestos'), reportes.tabla('comentarios')
+        comentarios = (
+            select(c.c.presupuesto_id, c.c.archivado, func.count().label('n'))
+            .group_by(c.c.presupuesto_id, c.c.archivado)
+            .subquery()
+        )
+        anio = cast(func.strftime('%Y', p.c.fecha), Integer)
+        consulta = (
+            select(
+                anio, Categoria.nombre, func.count(), func.sum(p.c.monto), func.sum(p.c.cantidad_gasto),
+                func.sum(p.c.likes), func.sum(p.c.dislikes), func.coalesce(func.sum(comentarios.c.n), 0),
+            )
+            .select_from(
+                p
+                .outerjoin(Categoria, Categoria.id == p.c.categoria_id)
+                .outerjoin(comentarios, and_(comentarios.c.presupuesto_id == p.c.id,
+                                             comentarios.c.archivado == p.c.archivado))
+            )
+            .group_by(anio, Categoria.nombre)
+            .order_by(anio.desc(), Categoria.nombre)
+        )
+        return serializacion.responder({
+            'generado': reportes.generada(),
+            'columnas': ['anio', 'categoria', 'proyectos', 'monto', 'cantidad_gasto', 'likes', 'dislikes', 'comentarios'],
+            'filas': [list(f) for f in reportes.ejecutar(consulta)],
+        })
+
+    @app.route('/admin/reportes/<tabla>.csv')
+    @login_required
+    @admin_required
+    @reportes.ruta
+    def admin_reportes_csv(tabla):
+        """
+        Exporta presupuestos, votos_presupuesto o comentarios completos en CSV (en streaming),
+        activos y archivados (columna `archivado`).
+        """
+        if tabla not in reportes.EXPORTABLES:
+            abort(404)
+        t = reportes.tabla(tabla)
+        resultado = reportes.ejecutar(select(t).order_by(t.c.archivado, t.c.id))
+
+        def filas():
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            escritor.writerow(resultado.keys())
+            for lote in resultado.partitions(500):
+                escritor.writerows(lote)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+
+        nombre = f'{tabla}-{reportes.generada().replace(":", "")}.csv'
+        return Response(stream_with_context(filas()), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={nombre}',
+        })
+
     # -------------------------------------------------------------------------
     # RUTAS ADMIN: Edición in-place (carrusel, textos). Solo @academicos.mx.
     # -------------------------------------------------------------------------
@@ -557,7 +1035,7 @@ def create_app(config_class=Config):
         Usa imágenes placeholder de https://picsum.photos/400/300 y fechas actuales/recientes.
         Incluye categorías para probar filtros y descripción larga para el modal.
         """
-        if Presupuesto.query.count() > 0:
+        if Presupuesto.query.count() > 0 or ResumenArchivo.query.count() > 0:
             return False
         hoy = date.today()
         # 5 presupuestos con cantidad_gasto para verificar suma en Navbar (Total Invertido)
@@ -573,14 +1051,18 @@ def create_app(config_class=Config):
                 concepto=d['concepto'],
                 descripcion_corta=d['descripcion_corta'],
                 descripcion=d['descripcion'],
-                categoria=d['categoria'],
+                categoria_id=categorias.id_de(d['categoria']),
                 monto=d['monto'],
                 cantidad_gasto=d['cantidad_gasto'],
                 fecha=d['fecha'],
                 imagen_url=d['imagen_url'],
+                hot_score=tendencia.peso_inicial(),
             )
+            p.actualizar_resumen()
             db.session.add(p)
+        catalogo.incrementar()
         db.session.commit()
+        publicador.encolar_todo()
         return True
 
     @app.route('/admin/usuarios')
@@ -589,11 +1071,79 @@ def create_app(config_class=Config):
     def admin_usuarios():
         """
         Panel de gestión de usuarios. Solo Super Admin.
-        Tabla: Nombre, Correo, Rol (Admin o Super Admin).
+        Tabla paginada: Nombre, Correo, Rol (Admin o Super Admin), Votos y Última actividad.
+        ?q= busca por prefijo de correo; ?pagina= (USUARIOS_POR_PAGINA por página).
         Botón Eliminar solo visible para Super Admin; no puede eliminarse a sí mismo.
         """
-        usuarios = Usuario.query.order_by(Usuario.id.asc()).all()
-        return render_template('admin/usuarios.html', usuarios=usuarios)
+        q, paginacion, actividad = _pagina_usuarios()
+        return render_template('admin/usuarios.html', usuarios=paginacion.items, paginacion=paginacion, actividad=actividad, q=q)
+
+    @app.route('/api/admin/usuarios')
+    @login_required
+    @super_admin_required
+    def api_admin_usuarios():
+        """Misma página de usuarios que /admin/usuarios (?q=, ?pagina=) en JSON."""
+        q, paginacion, actividad = _pagina_usuarios()
+        return jsonify({
+            'q': q,
+            'pagina': paginacion.page,
+            'paginas': paginacion.pages,
+            'total': paginacion.total,
+            'usuarios': [
+                {
+                    'id': u.id,
+                    'nombre': u.nombre,
+                    'email': u.email,
+                    'rol': 'super_admin' if u.es_super_admin else ('admin' if u.es_admin else 'usuario'),
+                    'fecha_registro': u.fecha_registro.isoformat() if u.fecha_registro else None,
+                    'votos': actividad[u.id][0],
+                    'ultima_actividad': actividad[u.id][1].isoformat() if actividad[u.id][1] else None,
+                }
+                for u in paginacion.items
+            ],
+        })
+
+    def _pagina_usuarios():
+        """
+        (q, paginacion, actividad) para el panel de usuarios.
+        - q: prefijo de correo (minúsculas). Se filtra con un rango email >= q AND email < q', que
+          resuelve el índice de usuarios.email (LIKE en SQLite no lo usaría). Si el último carácter
+          no tiene un siguiente válido (>= U+D7FF) se usa LIKE escapado.
+        - actividad: {usuario_id: (votos, última actividad)} de UNA consulta agrupada sobre los
+          votos de los usuarios de la página; sin votos, la actividad es la fecha de registro.
+        """
+        q = request.args.get('q', '').strip().lower()
+        query = Usuario.query
+        if q:
+            if ord(q[-1]) < 0xD7FF:
+                siguiente = q[:-1] + chr(ord(q[-1]) + 1)
+                query = query.filter(Usuario.email >= q, Usuario.email < siguiente)
+            else:
+                # Sin código siguiente válido (sustitutos / U+10FFFF): LIKE escapado, sin rango
+                query = query.filter(Usuario.email.startswith(q, autoescape=True))
+            query = query.order_by(Usuario.email)
+        else:
+            query = query.order_by(Usuario.id.asc())
+        paginacion = query.paginate(
+            page=request.args.get('pagina', 1, type=int),
+            per_page=app.config['USUARIOS_POR_PAGINA'],
+            error_out=False,
+        )
+        ids = [u.id for u in paginacion.items]
+        votos = {}
+        if ids:
+            votos = {
+                uid: (n, ultimo)
+                for uid, n, ultimo in db.session.query(
+                    VotoPresupuesto.usuario_id, func.count(), func.max(VotoPresupuesto.fecha)
+                ).filter(VotoPresupuesto.usuario_id.in_(ids)).group_by(VotoPresupuesto.usuario_id)
+            }
+        actividad = {}
+        for u in paginacion.items:
+            n, ultimo = votos.get(u.id, (0, None))
+            fechas = [f for f in (ultimo, u.fecha_registro) if f]
+            actividad[u.id] = (n, max(fechas) if fechas else None)
+        return q, paginacion, actividad
 
     @app.route('/admin/usuarios/<int:id>/eliminar', methods=['POST'])
     @login_required
@@ -615,8 +1165,18 @@ def create_app(config_class=Config):
             db.session.commit()
             logout_user()
 
+        # Sus votos se borran por ON DELETE CASCADE; contadores y hot_score se ajustan una vez
+        votos = db.session.query(
+            VotoPresupuesto.presupuesto_id, VotoPresupuesto.tipo, VotoPresupuesto.fecha
+        ).filter_by(usuario_id=usuario.id).all()
+        votados = [pid for pid, _, _ in votos]
         db.session.delete(usuario)
+        db.session.flush()
+        _recontar_votos(votados)
+        tendencia.quitar_votos(votos)
         db.session.commit()
+        if votados:
+            publicador.encolar_todo()
         flash('Usuario eliminado correctamente.', 'info')
         return redirect(url_for('admin_usuarios'))
 
@@ -676,6 +1236,65 @@ def create_app(config_class=Config):
         flash('Imagen eliminada del carrusel.', 'info')
         return redirect(url_for('admin_carrusel'))
 
+    @app.route('/admin/categorias', methods=['GET', 'POST'])
+    @login_required
+    @admin_required
+    def admin_categorias():
+        """
+        Administración de categorías (tabla categorias).
+        GET: Lista con número de proyectos (activos y archivados). POST: Crear o renombrar.
+        """
+        if request.method == 'POST':
+            accion = request.form.get('accion', 'crear')
+            nombre = request.form.get('nombre', '').strip()[:100]
+            cid = request.form.get('categoria_id', type=int)
+            repetida = Categoria.query.filter(func.lower(Categoria.nombre) == nombre.lower(), Categoria.id != (cid or 0)).first()
+            if not nombre:
+                flash('Escribe el nombre de la categoría.', 'error')
+            elif repetida:
+                flash('Ya existe una categoría con ese nombre.', 'error')
+            elif accion == 'crear':
+                categorias.crear(nombre)
+                _categorias_modificadas()
+                flash('Categoría creada.', 'success')
+            else:
+                categoria = db.session.get(Categoria, cid)
+                if categoria:
+                    categoria.nombre = nombre
+                    _categorias_modificadas()
+                    flash('Categoría renombrada.', 'success')
+            return redirect(url_for('admin_categorias'))
+        lista = Categoria.query.order_by(Categoria.orden, Categoria.nombre).all()
+        return render_template('admin/categorias.html', categorias=lista, conteos=_proyectos_por_categoria())
+
+    @app.route('/admin/categorias/<int:id>/eliminar', methods=['POST'])
+    @login_required
+    @admin_required
+    def admin_categoria_eliminar(id):
+        """Elimina una categoría solo si ningún proyecto (activo o archivado) la usa."""
+        categoria = Categoria.query.get_or_404(id)
+        if _proyectos_por_categoria().get(id):
+            flash('No se puede eliminar: hay proyectos en esa categoría.', 'error')
+        else:
+            db.session.delete(categoria)
+            _categorias_modificadas()
+            flash('Categoría eliminada.', 'info')
+        return redirect(url_for('admin_categorias'))
+
+    def _proyectos_por_categoria():
+        """{categoria_id: proyectos} sumando activos (GROUP BY sobre el índice) y archivados."""
+        conteos = dict(db.session.query(Presupuesto.categoria_id, func.count()).group_by(Presupuesto.categoria_id).all())
+        for cid, n in db.session.query(ResumenArchivo.categoria_id, func.sum(ResumenArchivo.proyectos)).group_by(ResumenArchivo.categoria_id):
+            conteos[cid] = conteos.get(cid, 0) + n
+        return conteos
+
+    def _categorias_modificadas():
+        """Confirma el cambio e invalida la caché de categorías (este worker y, por versión, los demás)."""
+        catalogo.incrementar()
+        db.session.commit()
+        categorias.invalidar()
+        publicador.encolar_todo()
+
     @app.route('/admin/contenido', methods=['GET', 'POST'])
     @login_required
     @admin_required
@@ -708,7 +1327,98 @@ def create_app(config_class=Config):
     with app.app_context():
         from sqlalchemy import text
         os.makedirs(app.instance_path, exist_ok=True)
-        db.create_all()
+        # Solo la BD principal: el bind `reportes` es una copia de solo lectura
+        db.create_all(bind_key=None)
+
+        # Migración estado_catalogo: hora del último decaimiento de tendencia
+        try:
+            columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(estado_catalogo)")).fetchall()]
+            if columns and 'tendencia_decaida_at' not in columns:
+                db.session.execute(text("ALTER TABLE estado_catalogo ADD COLUMN tendencia_decaida_at DATETIME"))
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+        # Migración categorías: texto libre en presupuestos.categoria -> tabla categorias
+        # (categoria_id). También resumen_archivo y, si existe, la BD de archivo.
+        try:
+            categorias.sembrar()
+        except Exception:
+            # Otro proceso pudo sembrar a la vez: no impide migrar
+            db.session.rollback()
+            app.logger.exception('No se pudieron sembrar las categorías iniciales')
+        try:
+            columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(presupuestos)")).fetchall()]
+            if 'categoria' in columns:
+                db.session.execute(text(
+                    "INSERT INTO categorias (nombre, orden)"
+                    " SELECT DISTINCT categoria, (SELECT COALESCE(MAX(orden), -1) + 1 FROM categorias)"
+                    " FROM presupuestos WHERE categoria NOT IN (SELECT nombre FROM categorias)"
+                ))
+                if 'categoria_id' not in columns:
+                    db.session.execute(text("ALTER TABLE presupuestos ADD COLUMN categoria_id INTEGER REFERENCES categorias (id)"))
+                db.session.execute(text("UPDATE presupuestos SET categoria_id = (SELECT id FROM categorias WHERE nombre = presupuestos.categoria)"))
+                db.session.execute(text("DROP INDEX IF EXISTS ix_presupuestos_categoria_fecha_monto"))
+                db.session.execute(text("ALTER TABLE presupuestos DROP COLUMN categoria"))
+                db.session.commit()
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_presupuestos_categoria_id_fecha_monto ON presupuestos (categoria_id, fecha, monto)"))
+            db.session.commit()
+        except Exception:
+            # Sin categoria_id el modelo no puede leer presupuestos: no arrancar a medias
+            db.session.rollback()
+            app.logger.exception('Migración de categorías fallida en presupuestos')
+            raise
+        try:
+            columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(resumen_archivo)")).fetchall()]
+            if 'categoria' in columns:
+                db.session.execute(text("ALTER TABLE resumen_archivo RENAME TO resumen_archivo_v1"))
+                ResumenArchivo.__table__.create(db.session.connection())
+                db.session.execute(text(
+                    "INSERT INTO categorias (nombre, orden)"
+                    " SELECT DISTINCT categoria, (SELECT COALESCE(MAX(orden), -1) + 1 FROM categorias)"
+                    " FROM resumen_archivo_v1 WHERE categoria NOT IN (SELECT nombre FROM categorias)"
+                ))
+                db.session.execute(text(
+                    "INSERT INTO resumen_archivo (anio, categoria_id, proyectos, monto, cantidad_gasto, archivado_at)"
+                    " SELECT r.anio, c.id, r.proyectos, r.monto, r.cantidad_gasto, r.archivado_at"
+                    " FROM resumen_archivo_v1 r JOIN categorias c ON c.nombre = r.categoria"
+                ))
+                db.session.execute(text("DROP TABLE resumen_archivo_v1"))
+                db.session.commit()
+            if db.engine.url.get_backend_name() == 'sqlite':
+                db.session.remove()
+                archivo.actualizar_esquema(respaldo.ruta_bd(), app.config['ARCHIVO_PATH'])
+            categorias.invalidar()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Migración de categorías fallida en resumen_archivo o en la BD de archivo')
+
+        # Migración claves foráneas: votos_presupuesto y comentarios con ON DELETE CASCADE
+        # (SQLite no altera una FK: se reconstruye la tabla). Las filas huérfanas no se copian.
+        try:
+            for modelo in (VotoPresupuesto, Comentario):
+                tabla = modelo.__tablename__
+                # foreign_key_list: (id, seq, tabla, desde, hacia, on_update, on_delete, match)
+                fks = db.session.execute(text(f"PRAGMA foreign_key_list({tabla})")).fetchall()
+                if not fks or all(fk[6] == 'CASCADE' for fk in fks):
+                    continue
+                anteriores = [row[1] for row in db.session.execute(text(f"PRAGMA table_info({tabla})")).fetchall()]
+                indices = [row[0] for row in db.session.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :tabla AND sql IS NOT NULL"
+                ), {'tabla': tabla}).fetchall()]
+                db.session.execute(text(f"ALTER TABLE {tabla} RENAME TO {tabla}_v1"))
+                for indice in indices:
+                    db.session.execute(text(f"DROP INDEX {indice}"))
+                modelo.__table__.create(db.session.connection())
+                cols = ', '.join(c.name for c in modelo.__table__.columns if c.name in anteriores)
+                padres = ' AND '.join(
+                    f'{fk.parent.name} IN (SELECT id FROM {fk.column.table.name})' for fk in modelo.__table__.foreign_keys
+                )
+                db.session.execute(text(f"INSERT INTO {tabla} ({cols}) SELECT {cols} FROM {tabla}_v1 WHERE {padres}"))
+                db.session.execute(text(f"DROP TABLE {tabla}_v1"))
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
 
         # Migración presupuestos: cantidad_gasto y columnas previas
         try:
@@ -720,13 +1430,44 @@ def create_app(config_class=Config):
                 ('likes', 'ALTER TABLE presupuestos ADD COLUMN likes INTEGER DEFAULT 0'),
                 ('dislikes', 'ALTER TABLE presupuestos ADD COLUMN dislikes INTEGER DEFAULT 0'),
                 ('cantidad_gasto', 'ALTER TABLE presupuestos ADD COLUMN cantidad_gasto REAL DEFAULT 0'),
+                ('hot_score', 'ALTER TABLE presupuestos ADD COLUMN hot_score REAL NOT NULL DEFAULT 0'),
+                ('resumen_card', 'ALTER TABLE presupuestos ADD COLUMN resumen_card VARCHAR(130)'),
             ]:
                 if columns and col not in columns:
                     db.session.execute(text(def_sql))
                     db.session.commit()
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_presupuestos_hot_score ON presupuestos (hot_score)"))
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_pending_registro_creado_at ON pending_registro (creado_at)"))
+            db.session.commit()
+            # BD antiguas: inicializar hot_score desde el historial de votos y comentarios
+            if columns and 'hot_score' not in columns:
+                tendencia.recalcular()
+            # BD antiguas: llenar actividad_diaria (tabla nueva) desde el historial
+            if ActividadDiaria.query.first() is None and (
+                VotoPresupuesto.query.first() is not None or Comentario.query.first() is not None
+            ):
+                actividad.reconstruir()
+                db.session.commit()
+            # BD antiguas: precalcular resumen_card en una sola sentencia (misma regla que actualizar_resumen)
+            if columns and 'resumen_card' not in columns:
+                db.session.execute(text(
+                    "UPDATE presupuestos SET resumen_card = CASE"
+                    " WHEN length(COALESCE(NULLIF(descripcion_corta, ''), NULLIF(descripcion, ''))) > :largo"
+                    " THEN substr(COALESCE(NULLIF(descripcion_corta, ''), NULLIF(descripcion, '')), 1, :largo) || '...'"
+                    " ELSE COALESCE(NULLIF(descripcion_corta, ''), NULLIF(descripcion, '')) END"
+                ), {'largo': Presupuesto.RESUMEN_LARGO})
+                db.session.commit()
         except Exception:
             db.session.rollback()
 
+        # Migración presupuestos: AUTOINCREMENT y reserva de los ids archivados (no se reutilizan)
+        if db.engine.url.get_backend_name() == 'sqlite':
+            try:
+                db.session.remove()
+                archivo.asegurar_ids_unicos(respaldo.ruta_bd(), app.config['ARCHIVO_PATH'])
+            except Exception:
+                db.session.rollback()
+
         # Migración usuarios: is_super_admin (jerarquía de roles)
         try:
             result = db.session.execute(text("PRAGMA table_info(usuarios)"))
@@ -749,6 +1490,147 @@ def create_app(config_class=Config):
         # ---------------------------------------------------------------------
         seed_data()
 
+    # Caché de bytecode vacía (contenedor nuevo): compilar aquí, con todos los filtros registrados
+    try:
+        plantillas.compilar_si_falta(app)
+    except Exception:
+        app.logger.exception('[plantillas] Error al compilar')
+
+    # Precalentamiento opcional: plantillas y cachés listas antes del primer visitante
+    if app.config.get('PLANTILLAS_PRECALENTAR'):
+        try:
+            plantillas.precalentar(app)
+        except Exception:
+            app.logger.exception('[plantillas] Error al precalentar')
+
+    # -------------------------------------------------------------------------
+    # Comandos CLI (flask <comando>): mantenimiento del ranking de tendencia.
+    # -------------------------------------------------------------------------
+    @app.cli.command('tendencia-decaer')
+    @click.option('--horas', type=float, default=None, help='Horas a aplicar (por defecto, las transcurridas desde el último decaimiento).')
+    def tendencia_decaer_cmd(horas):
+        """Re-decae hot_score de todos los proyectos en una sola sentencia, por las horas reales transcurridas (cron)."""
+        factor = tendencia.decaer(horas)
+        click.echo(f'hot_score multiplicado por {factor:.6f}.')
+
+    @app.cli.command('tendencia-recalcular')
+    def tendencia_recalcular_cmd():
+        """Reconstruye hot_score desde el historial de votos y comentarios."""
+        n = tendencia.recalcular()
+        click.echo(f'hot_score recalculado para {n} proyectos.')
+
+    @app.cli.command('actividad-reconstruir')
+    def actividad_reconstruir_cmd():
+        """Reconstruye la serie diaria (actividad_diaria) desde el historial de votos y comentarios."""
+        n = actividad.reconstruir()
+        db.session.commit()
+        click.echo(f'actividad_diaria reconstruida: {n} filas (proyecto, día).')
+
+    @app.cli.command('publicar')
+    @click.option('--procesos', type=int, default=None, help='Procesos en paralelo (por defecto, núcleos de CPU).')
+    def publicar_cmd(procesos):
+        """Reconstruye por completo las páginas públicas estáticas en PUBLICADOR_DIR."""
+        n = publicador.publicar_todo(app, procesos)
+        click.echo(f'{n} archivos publicados en {app.config["PUBLICADOR_DIR"]}.')
+
+    @app.cli.command('plantillas-compilar')
+    def plantillas_compilar_cmd():
+        """Compila todas las plantillas y guarda su bytecode en PLANTILLAS_CACHE_DIR (paso de despliegue)."""
+        n, segundos = plantillas.compilar(app)
+        click.echo(f'{n} plantillas compiladas en {segundos} s ({app.config["PLANTILLAS_CACHE_DIR"]}).')
+
+    # -------------------------------------------------------------------------
+    # Comandos CLI: cola de correo (útiles con MAIL_COLA_ACTIVA=false y cron).
+    # -------------------------------------------------------------------------
+    @app.cli.command('correo-procesar')
+    def correo_procesar_cmd():
+        """Envía todos los correos listos de la cola y barre registros pendientes vencidos."""
+        total_enviados = total_fallidos = 0
+        while True:
+            enviados, fallidos = correo.procesar_cola(app.config)
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados + fallidos < app.config['MAIL_LOTE']:
+                break
+        registros, correos = correo.barrer_expirados(app.config)
+        click.echo(f'Enviados: {total_enviados}. Reprogramados/fallidos: {total_fallidos}. '
+                   f'Registros vencidos eliminados: {registros}. Correos antiguos eliminados: {correos}.')
+
+    # -------------------------------------------------------------------------
+    # Comandos CLI: archivo de años fiscales cerrados.
+    # -------------------------------------------------------------------------
+    @app.cli.command('archivar')
+    @click.option('--hasta', type=int, default=None, help='Último año a archivar (por defecto, el año anterior al actual).')
+    def archivar_cmd(hasta):
+        """Mueve proyectos de años cerrados (con votos y comentarios) a ARCHIVO_PATH, tras respaldar ambas BD."""
+        hasta = hasta or date.today().year - 1
+        if hasta >= date.today().year:
+            raise click.ClickException('Solo se pueden archivar años fiscales cerrados.')
+        # Respaldo previo (BD principal + archivo actual): si falla, no se mueve nada
+        try:
+            previo = respaldo.respaldar(app.config)
+        except Exception as e:
+            raise click.ClickException(f'No se archivó: el respaldo previo falló ({e}).')
+        click.echo(f'Respaldo previo: {previo["archivo"]}.')
+        try:
+            r = archivo.archivar(respaldo.ruta_bd(), app.config['ARCHIVO_PATH'], hasta)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        anios = ', '.join(str(a) for a in r['anios']) or 'ninguno'
+        click.echo(f'Archivados {r["proyectos"]} proyectos, {r["votos"]} votos y {r["comentarios"]} comentarios '
+                   f'(años: {anios}) en {app.config["ARCHIVO_PATH"]}.')
+        if r['proyectos'] and publicador.publicador.activo:
+            # Las páginas de los proyectos movidos ya no se sirven como estáticas
+            n = publicador.publicar_todo(app)
+            click.echo(f'{n} archivos publicados en {app.config["PUBLICADOR_DIR"]}.')
+
+    # -------------------------------------------------------------------------
+    # Comandos CLI: respaldos en línea (no detienen la app ni bloquean escrituras).
+    # -------------------------------------------------------------------------
+    @app.cli.command('respaldar')
+    @click.option('--comprimir/--sin-comprimir', default=None, help='gzip del respaldo (por defecto, RESPALDO_COMPRIMIR).')
+    @click.option('--destino', type=click.Path(file_okay=False), default=None, help='Directorio (por defecto, RESPALDO_DIR).')
+    @click.option('--verificar', 'verificar_despues', is_flag=True, help='Restaurar y verificar el respaldo al terminar.')
+    def respaldar_cmd(comprimir, destino, verificar_despues):
+        """Respaldo en línea de la BD con la API de backup de SQLite, con rotación."""
+        r = respaldo.respaldar(app.config, comprimir, destino)
+        click.echo(f'Respaldo: {r["archivo"]} ({sum(r["filas"].values())} filas, {r["segundos"]} s, '
+                   f'{r["reinicios"]} reinicios). Rotados: {len(r["rotados"])}.')
+        if r['archivo_anios']:
+            click.echo(f'Archivo de años cerrados: {r["archivo_anios"]["archivo"]} '
+                       f'({sum(r["archivo_anios"]["filas"].values())} filas).')
+        if verificar_despues:
+            _verificar_respaldo(r['archivo'])
+
+    @app.cli.command('reportes-actualizar')
+    def reportes_actualizar_cmd():
+        """Regenera la instantánea de solo lectura para reportes (REPORTES_PATH)."""
+        resultado = reportes.actualizar(app.config)
+        click.echo(
+            f'Instantánea {resultado["generada"]} en {resultado["archivo"]} '
+            f'({sum(resultado["filas"].values())} filas, {resultado["reinicios"]} reinicios, {resultado["segundos"]} s).'
+        )
+
+    @app.cli.command('respaldo-verificar')
+    @click.argument('archivo', required=False, type=click.Path(exists=True, dir_okay=False))
+    def respaldo_verificar_cmd(archivo):
+        """Restaura un respaldo (por defecto, el más reciente) y verifica integridad y filas."""
+        if not archivo:
+            existentes = respaldo.listar(app.config['RESPALDO_DIR'])
+            if not existentes:
+                raise click.ClickException(f'No hay respaldos en {app.config["RESPALDO_DIR"]}.')
+            archivo = existentes[-1]
+        _verificar_respaldo(archivo)
+
+    def _verificar_respaldo(archivo):
+        ok, integridad, diferencias = respaldo.verificar(archivo)
+        click.echo(f'{archivo}: integrity_check={integridad}')
+        for tabla, (esperadas, encontradas) in sorted(diferencias.items()):
+            click.echo(f'  {tabla}: esperadas {esperadas}, encontradas {encontradas}')
+        if not ok:
+            raise click.ClickException('La verificación del respaldo falló.')
+        click.echo('Verificación correcta.')
+
     return app
 
 
@@ -0,0 +1,325 @@
+"""
+=============================================================================
+ARCHIVO DE AÑOS FISCALES CERRADOS
+=============================================================================
+
+presupuestos, votos_presupuesto y comentarios solo crecen. `flask archivar`
+mueve los proyectos de años cerrados (con sus votos y comentarios) a otra BD
+SQLite (ARCHIVO_PATH) en una sola transacción sobre ambos archivos, y acumula
+sus totales en resumen_archivo. Así la BD principal se queda pequeña.
+
+- Cada conexión del engine hace ATTACH del archivo en solo lectura con el alias
+  `archivo` (mode=ro): la app nunca escribe en él.
+- presupuestos_lista con un año archivado lee también archivo.presupuestos
+  (listar/combinar). El detalle de un proyecto archivado se sirve desde el archivo.
+- El total de la navbar y las facetas suman resumen_archivo (catalogo.py), sin
+  abrir el archivo.
+- La serie diaria (actividad_diaria) de los proyectos archivados se borra.
+- Los votos y comentarios archivados reciben ids nuevos en el archivo. El id de
+  cada proyecto se conserva: si ya existe en el archivo, archivar() falla y no
+  modifica nada. presupuestos usa AUTOINCREMENT y cada archivado sube
+  sqlite_sequence al mayor id archivado, así un proyecto nuevo nunca toma el id
+  (ni el enlace /presupuesto/<id>) de uno archivado.
+"""
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import MetaData, event, literal, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql import operators
+
+from extensions import db
+from models import Categoria, Presupuesto
+
+ALIAS = 'archivo'
+TABLAS = ('presupuestos', 'votos_presupuesto', 'comentarios')
+
+_ruta = None
+_metadata = MetaData()
+_presupuestos = Presupuesto.__table__.to_metadata(_metadata, schema=ALIAS)
+
+
+def _uri_solo_lectura(ruta):
+    return Path(os.path.abspath(ruta)).as_uri() + '?mode=ro'
+
+
+def _adjuntar(dbapi_conn, _registro):
+    """ATTACH en solo lectura al abrir cada conexión (si el archivo ya existe)."""
+    if _ruta and os.path.exists(_ruta):
+        dbapi_conn.execute(f'ATTACH DATABASE ? AS {ALIAS}', (_uri_solo_lectura(_ruta),))
+
+
+def init_app(app):
+    global _ruta
+    _ruta = app.config['ARCHIVO_PATH']
+    with app.app_context():
+        if db.engine.url.get_backend_name() == 'sqlite':
+            event.listen(db.engine, 'connect', _adjuntar)
+
+
+def disponible():
+    """
+    True si el archivo está adjunto a la conexión actual. Las conexiones abiertas
+    antes de que existiera el archivo lo adjuntan aquí.
+    """
+    if not _ruta or not os.path.exists(_ruta):
+        return False
+    bases = {fila[1] for fila in db.session.execute(text('PRAGMA database_list'))}
+    if ALIAS not in bases:
+        db.session.execute(text(f'ATTACH DATABASE :ruta AS {ALIAS}'), {'ruta': _uri_solo_lectura(_ruta)})
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Lectura
+# -----------------------------------------------------------------------------
+
+def _en_archivo(expresion):
+    """Traduce un ORDER BY sobre Presupuesto (ej. Presupuesto.likes.desc()) a la tabla archivada."""
+    columna = _presupuestos.c[expresion.element.key]
+    return columna.desc() if expresion.modifier is operators.desc_op else columna.asc()
+
+
+def _con_categoria(*columnas):
+    """SELECT sobre archivo.presupuestos + nombre de la categoría (tabla categorias de la BD principal)."""
+    return (
+        select(*columnas, Categoria.nombre.label('categoria'))
+        .select_from(_presupuestos.outerjoin(Categoria, Categoria.id == _presupuestos.c.categoria_id))
+    )
+
+
+def listar(columnas, categoria, anio, orden):
+    """Filas archivadas de un año (mismas columnas que las cards + archivado=True y categoria).
+    categoria: id de la categoría o None."""
+    if not disponible():
+        return []
+    t = _presupuestos
+    q = (
+        _con_categoria(*[t.c[c.key] for c in columnas], literal(True).label('archivado'))
+        .where(t.c.fecha >= date(anio, 1, 1), t.c.fecha <= date(anio, 12, 31))
+        .order_by(*[_en_archivo(e) for e in orden])
+    )
+    if categoria is not None:
+        q = q.where(t.c.categoria_id == categoria)
+    return db.session.execute(q).all()
+
+
+def combinar(activos, archivados, orden):
+    """Une filas de ambas BD respetando el orden (solo si un año quedó repartido)."""
+    if not archivados:
+        return activos
+    if not activos:
+        return archivados
+    filas = list(activos) + list(archivados)
+    for expresion in reversed(orden):
+        filas.sort(key=lambda f: getattr(f, expresion.element.key), reverse=expresion.modifier is operators.desc_op)
+    return filas
+
+
+def obtener(id):
+    """Proyecto archivado por id (fila con las columnas de Presupuesto) o None."""
+    if not disponible():
+        return None
+    try:
+        return db.session.execute(_con_categoria(_presupuestos).where(_presupuestos.c.id == id)).first()
+    except OperationalError:
+        # Archivo creado pero aún sin tablas (un primer archivado que falló)
+        return None
+
+
+def anio_archivado(anio):
+    """True si hay proyectos de ese año en el archivo (según resumen_archivo)."""
+    return db.session.execute(
+        text('SELECT 1 FROM resumen_archivo WHERE anio = :anio LIMIT 1'), {'anio': anio}
+    ).first() is not None
+
+
+# -----------------------------------------------------------------------------
+# Archivado (comando `flask archivar`)
+# -----------------------------------------------------------------------------
+
+def _columnas(conn, esquema, tabla):
+    return [(fila[1], fila[2]) for fila in conn.execute(f'PRAGMA {esquema}.table_info({tabla})')]
+
+
+def _preparar_esquema(conn, tabla):
+    """Crea la tabla en el archivo (mismo SQL) o le agrega las columnas nuevas de la principal."""
+    existentes = {nombre for nombre, _ in _columnas(conn, 'destino', tabla)}
+    if not existentes:
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()[0]
+        conn.execute(re.sub(r'^CREATE TABLE\s+"?' + tabla + r'"?', f'CREATE TABLE destino.{tabla}', sql, count=1))
+        return
+    principales = _columnas(conn, 'main', tabla)
+    for nombre, tipo in principales:
+        if nombre not in existentes:
+            conn.execute(f'ALTER TABLE destino.{tabla} ADD COLUMN {nombre} {tipo}')
+    if tabla == 'presupuestos' and 'categoria' in existentes and 'categoria' not in dict(principales):
+        _migrar_categoria(conn)
+
+
+def _migrar_categoria(conn):
+    """Archivo anterior a la tabla categorias: texto -> categoria_id (crea las que falten)."""
+    conn.execute(
+        'INSERT INTO main.categorias (nombre, orden)'
+        ' SELECT DISTINCT categoria, (SELECT COALESCE(MAX(orden), -1) + 1 FROM main.categorias)'
+        ' FROM destino.presupuestos WHERE categoria NOT IN (SELECT nombre FROM main.categorias)'
+    )
+    conn.execute(
+        'UPDATE destino.presupuestos SET categoria_id ='
+        ' (SELECT c.id FROM main.categorias c WHERE c.nombre = presupuestos.categoria)'
+    )
+    conn.execute('ALTER TABLE destino.presupuestos DROP COLUMN categoria')
+
+
+def actualizar_esquema(ruta_bd, ruta_archivo):
+    """Alinea las tablas de un archivo existente con las de la BD principal (al arrancar)."""
+    if not os.path.exists(ruta_archivo):
+        return
+    conn = sqlite3.connect(ruta_bd, isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS destino', (ruta_archivo,))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for tabla in TABLAS:
+                if _columnas(conn, 'destino', tabla):
+                    _preparar_esquema(conn, tabla)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+
+def _reservar_ids(conn):
+    """Sube sqlite_sequence de presupuestos hasta el mayor id archivado (y el mayor activo)."""
+    maximo = conn.execute(
+        'SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM main.presupuestos),'
+        ' (SELECT COALESCE(MAX(id), 0) FROM destino.presupuestos))'
+    ).fetchone()[0]
+    if not conn.execute(
+        "UPDATE main.sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'presupuestos'", (maximo,)
+    ).rowcount:
+        conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('presupuestos', ?)", (maximo,))
+
+
+def _reconstruir_con_autoincremento(conn):
+    """BD anterior: presupuestos sin AUTOINCREMENT -> misma tabla (del modelo) con AUTOINCREMENT."""
+    t = Presupuesto.__table__
+    dialecto = sqlite.dialect()
+    ddl = str(CreateTable(t).compile(dialect=dialecto))
+    conn.execute(re.sub(r'^\s*CREATE TABLE\s+"?presupuestos"?', 'CREATE TABLE presupuestos_v2', ddl, count=1))
+    anteriores = {nombre for nombre, _ in _columnas(conn, 'main', 'presupuestos')}
+    cols = ', '.join(c.name for c in t.columns if c.name in anteriores)
+    conn.execute(f'INSERT INTO presupuestos_v2 ({cols}) SELECT {cols} FROM presupuestos')
+    # La conexión sqlite3 no activa foreign_keys: votos y comentarios no se borran en cascada
+    conn.execute('DROP TABLE presupuestos')
+    conn.execute('ALTER TABLE presupuestos_v2 RENAME TO presupuestos')
+    for indice in t.indexes:
+        conn.execute(str(CreateIndex(indice).compile(dialect=dialecto)))
+
+
+def asegurar_ids_unicos(ruta_bd, ruta_archivo):
+    """
+    Al arrancar: reconstruye presupuestos con AUTOINCREMENT si es de una versión anterior
+    y reserva los ids ya archivados (sqlite_sequence), para que no se reutilicen.
+    """
+    conn = sqlite3.connect(ruta_bd, isolation_level=None)
+    try:
+        con_archivo = os.path.exists(ruta_archivo)
+        if con_archivo:
+            conn.execute('ATTACH DATABASE ? AS destino', (ruta_archivo,))
+            con_archivo = bool(_columnas(conn, 'destino', 'presupuestos'))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'presupuestos'").fetchone()[0]
+            if 'AUTOINCREMENT' not in sql.upper():
+                _reconstruir_con_autoincremento(conn)
+            if con_archivo:
+                _reservar_ids(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+
+def archivar(ruta_bd, ruta_archivo, hasta_anio):
+    """
+    Mueve los proyectos con fecha <= hasta_anio (y sus votos y comentarios) al archivo.
+    Retorna {'proyectos', 'votos', 'comentarios', 'anios'}. Lanza ValueError si algún id
+    de proyecto ya existe en el archivo.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_archivo)), exist_ok=True)
+    limite = date(hasta_anio + 1, 1, 1).isoformat()
+    ids = 'SELECT id FROM main.presupuestos WHERE fecha < :limite'
+    conn = sqlite3.connect(ruta_bd, isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS destino', (ruta_archivo,))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for tabla in TABLAS:
+                _preparar_esquema(conn, tabla)
+            conn.execute('CREATE INDEX IF NOT EXISTS destino.ix_presupuestos_fecha ON presupuestos (fecha)')
+            conn.execute('CREATE INDEX IF NOT EXISTS destino.ix_comentarios_presupuesto ON comentarios (presupuesto_id)')
+            duplicados = conn.execute(
+                f'SELECT COUNT(*) FROM destino.presupuestos WHERE id IN ({ids})', {'limite': limite}
+            ).fetchone()[0]
+            if duplicados:
+                raise ValueError(f'{duplicados} id(s) de proyecto ya existen en el archivo.')
+
+            resumen = conn.execute(
+                "SELECT CAST(strftime('%Y', fecha) AS INTEGER), categoria_id, COUNT(*),"
+                " COALESCE(SUM(monto), 0), COALESCE(SUM(cantidad_gasto), 0)"
+                ' FROM main.presupuestos WHERE fecha < :limite GROUP BY 1, 2',
+                {'limite': limite},
+            ).fetchall()
+
+            movidos = {}
+            for tabla, condicion, con_id in (
+                ('presupuestos', 'fecha < :limite', True),
+                ('votos_presupuesto', f'presupuesto_id IN ({ids})', False),
+                ('comentarios', f'presupuesto_id IN ({ids})', False),
+            ):
+                # Votos y comentarios toman ids nuevos en el archivo (los de la principal se reutilizan)
+                cols = ', '.join(n for n, _ in _columnas(conn, 'main', tabla) if con_id or n != 'id')
+                movidos[tabla] = conn.execute(
+                    f'INSERT INTO destino.{tabla} ({cols}) SELECT {cols} FROM main.{tabla} WHERE {condicion}',
+                    {'limite': limite},
+                ).rowcount
+            # actividad_diaria no se archiva: sus filas se van con el proyecto
+            for tabla in ('comentarios', 'votos_presupuesto', 'actividad_diaria'):
+                conn.execute(f'DELETE FROM main.{tabla} WHERE presupuesto_id IN ({ids})', {'limite': limite})
+            conn.execute('DELETE FROM main.presupuestos WHERE fecha < :limite', {'limite': limite})
+            _reservar_ids(conn)
+
+            conn.executemany(
+                'INSERT INTO main.resumen_archivo (anio, categoria_id, proyectos, monto, cantidad_gasto, archivado_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (anio, categoria_id) DO UPDATE SET'
+                ' proyectos = proyectos + excluded.proyectos, monto = monto + excluded.monto,'
+                ' cantidad_gasto = cantidad_gasto + excluded.cantidad_gasto, archivado_at = excluded.archivado_at',
+                [fila + (datetime.utcnow().isoformat(sep=' '),) for fila in resumen],
+            )
+            # Equivale a catalogo.incrementar(): invalida facetas y cachés de todos los workers
+            if not conn.execute('UPDATE main.estado_catalogo SET version = version + 1 WHERE id = 1').rowcount:
+                conn.execute('INSERT INTO main.estado_catalogo (id, version) VALUES (1, 1)')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    return {
+        'proyectos': movidos['presupuestos'],
+        'votos': movidos['votos_presupuesto'],
+        'comentarios': movidos['comentarios'],
+        'anios': sorted({fila[0] for fila in resumen}),
+    }
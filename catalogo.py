@@ -0,0 +1,110 @@
+"""
+=============================================================================
+CATÁLOGO: versión y facetas del listado de presupuestos
+=============================================================================
+
+- version() / incrementar(): contador en la tabla estado_catalogo (fila id=1).
+  Las rutas que crean, editan o eliminan presupuestos llaman a incrementar()
+  antes del commit. Leer la versión es una consulta por clave primaria.
+- facetas(categoria, anio): número de proyectos y suma de monto por categoría
+  (respetando el año activo) y por año (respetando la categoría activa).
+  Dos GROUP BY (por categoria_id entero) resueltos con el índice cubriente
+  ix_presupuestos_categoria_id_fecha_monto;
+  el resultado se guarda en memoria hasta que cambia la versión del catálogo.
+  Los años archivados se suman desde resumen_archivo (una fila por año y categoría).
+"""
+
+import threading
+from datetime import date
+
+from sqlalchemy import func, update
+
+from extensions import db
+from models import Presupuesto, EstadoCatalogo, ResumenArchivo
+
+_cache = {}
+_cache_lock = threading.Lock()
+_MAX_ENTRADAS = 256
+
+
+def version():
+    """Versión actual del catálogo (0 si aún no hubo cambios)."""
+    v = db.session.query(EstadoCatalogo.version).filter(EstadoCatalogo.id == 1).scalar()
+    return v or 0
+
+
+def incrementar():
+    """Marca el catálogo como modificado (se confirma con el commit de la ruta)."""
+    actualizadas = db.session.execute(
+        update(EstadoCatalogo).where(EstadoCatalogo.id == 1).values(version=EstadoCatalogo.version + 1)
+    ).rowcount
+    if not actualizadas:
+        db.session.add(EstadoCatalogo(id=1, version=1))
+
+
+def filtro_anio(anio):
+    """Condiciones de rango sobre fecha para un año (aprovechan el índice)."""
+    return (Presupuesto.fecha >= date(anio, 1, 1), Presupuesto.fecha <= date(anio, 12, 31))
+
+
+def _calcular(categoria, anio):
+    monto = func.coalesce(func.sum(Presupuesto.monto), 0)
+
+    q_cat = db.session.query(Presupuesto.categoria_id, func.count(), monto)
+    if anio:
+        q_cat = q_cat.filter(*filtro_anio(anio))
+    por_categoria = {cid: (n, float(m)) for cid, n, m in q_cat.group_by(Presupuesto.categoria_id)}
+
+    anio_col = func.strftime('%Y', Presupuesto.fecha)
+    q_anio = db.session.query(anio_col, func.count(), monto)
+    if categoria is not None:
+        q_anio = q_anio.filter(Presupuesto.categoria_id == categoria)
+    anios = {int(a): (n, float(m)) for a, n, m in q_anio.group_by(anio_col) if a}
+
+    # Años archivados (archivo.py): sus totales viven en resumen_archivo
+    for r in ResumenArchivo.query:
+        if not anio or r.anio == anio:
+            n, m = por_categoria.get(r.categoria_id, (0, 0.0))
+            por_categoria[r.categoria_id] = (n + r.proyectos, m + r.monto)
+        if categoria is None or r.categoria_id == categoria:
+            n, m = anios.get(r.anio, (0, 0.0))
+            anios[r.anio] = (n + r.proyectos, m + r.monto)
+
+    por_anio = [
+        {'valor': a, 'proyectos': n, 'monto': m}
+        for a, (n, m) in sorted(anios.items(), reverse=True)
+    ]
+    return por_categoria, por_anio
+
+
+def facetas(categorias, categoria=None, anio=None):
+    """
+    Facetas del listado. categorias: [(id, nombre)] (se incluyen aunque tengan 0 proyectos);
+    categoria: id de la categoría activa (None = todas; 0 = categoría inexistente, ningún proyecto).
+    Retorna {'version', 'categorias': [{valor, proyectos, monto}], 'anios': [...]} (valor = nombre).
+    """
+    v = version()
+    # None y 0 son filtros distintos: no deben compartir entrada
+    clave = (v, categoria, anio or None)
+    with _cache_lock:
+        resultado = _cache.get(clave)
+    if resultado is not None:
+        return resultado
+
+    por_categoria, por_anio = _calcular(categoria, anio)
+    resultado = {
+        'version': v,
+        'categorias': [
+            {'valor': nombre, 'proyectos': por_categoria.get(cid, (0, 0.0))[0], 'monto': por_categoria.get(cid, (0, 0.0))[1]}
+            for cid, nombre in categorias
+        ],
+        'anios': por_anio,
+    }
+    with _cache_lock:
+        # Entradas de versiones anteriores ya no sirven
+        for k in [k for k in _cache if k[0] != v]:
+            del _cache[k]
+        if len(_cache) >= _MAX_ENTRADAS:
+            _cache.clear()
+        _cache[clave] = resultado
+    return resultado
@@ -0,0 +1,103 @@
+"""
+=============================================================================
+CATEGORÍAS: caché en memoria de la tabla categorias
+=============================================================================
+
+Presupuesto guarda solo categoria_id; plantillas, facetas y filtros traducen
+id <-> nombre con esta caché, sin consultar la BD por fila ni por petición.
+
+- La caché se recarga cuando cambia la versión del catálogo (catalogo.py), que
+  se revisa como mucho cada _REVISAR_SEGUNDOS. Las rutas que modifican
+  categorías llaman a catalogo.incrementar() y a invalidar(): el worker actual
+  recarga de inmediato y los demás en unos segundos.
+- INICIALES: categorías que se crean en una BD nueva (la antigua lista CATEGORIAS).
+"""
+
+import threading
+import time
+
+from sqlalchemy import func
+
+import catalogo
+from extensions import db
+from models import Categoria
+
+INICIALES = [
+    'Infraestructura',
+    'Equipamiento',
+    'Servicios',
+    'Material didáctico',
+    'Mantenimiento',
+    'Capacitación',
+    'Otros',
+]
+
+_REVISAR_SEGUNDOS = 5
+
+_lock = threading.Lock()
+_estado = {'version': None, 'revisado': 0.0, 'lista': [], 'por_id': {}, 'por_nombre': {}}
+
+
+def _vigente():
+    """Estado de la caché, recargado si cambió la versión del catálogo."""
+    ahora = time.monotonic()
+    if _estado['version'] is not None and ahora - _estado['revisado'] < _REVISAR_SEGUNDOS:
+        return _estado
+    v = catalogo.version()
+    with _lock:
+        if v != _estado['version']:
+            lista = [
+                (cid, nombre)
+                for cid, nombre in db.session.query(Categoria.id, Categoria.nombre).order_by(Categoria.orden, Categoria.nombre)
+            ]
+            _estado.update(
+                version=v,
+                lista=lista,
+                por_id=dict(lista),
+                por_nombre={nombre: cid for cid, nombre in lista},
+            )
+        _estado['revisado'] = ahora
+    return _estado
+
+
+def invalidar():
+    """Fuerza la recarga en la próxima lectura (tras crear/renombrar/eliminar)."""
+    with _lock:
+        _estado['version'] = None
+
+
+def todas():
+    """[(id, nombre)] en orden de visualización."""
+    return _vigente()['lista']
+
+
+def nombres():
+    return [nombre for _, nombre in todas()]
+
+
+def nombre(categoria_id):
+    """Nombre de una categoría ('' si no existe)."""
+    return _vigente()['por_id'].get(categoria_id, '')
+
+
+def id_de(nombre):
+    """Id de una categoría por nombre (None si no existe)."""
+    return _vigente()['por_nombre'].get(nombre) if nombre else None
+
+
+def crear(nombre):
+    """Agrega una categoría al final (sin commit)."""
+    orden = db.session.query(func.coalesce(func.max(Categoria.orden), -1)).scalar() + 1
+    categoria = Categoria(nombre=nombre, orden=orden)
+    db.session.add(categoria)
+    return categoria
+
+
+def sembrar():
+    """BD nueva: crea las categorías INICIALES si la tabla está vacía. Retorna True si creó."""
+    if Categoria.query.first() is not None:
+        return False
+    db.session.add_all(Categoria(nombre=n, orden=i) for i, n in enumerate(INICIALES))
+    db.session.commit()
+    invalidar()
+    return True
@@ -46,6 +46,101 @@ class Config:
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@cucea.udg.mx')
     VERIFICATION_CODE_EXPIRY_MINUTES = 15
 
+    # -------------------------------------------------------------------------
+    # Cola de correo saliente (correo.py): los correos se guardan en la tabla
+    # correos_salientes y un hilo en segundo plano los envía en lotes por una sola
+    # conexión SMTP, con reintentos y backoff. Otro hilo, activo aunque la cola no
+    # lo esté, borra en lote los pending_registro vencidos y los correos enviados
+    # antiguos cada MAIL_BARRIDO_SEGUNDOS (0 = solo con `flask correo-procesar`).
+    # -------------------------------------------------------------------------
+    MAIL_COLA_ACTIVA = os.environ.get('MAIL_COLA_ACTIVA', 'false').lower() in ('true', '1', 'yes')
+    MAIL_LOTE = 20
+    MAIL_INTERVALO_SEGUNDOS = 5
+    MAIL_TIMEOUT_SEGUNDOS = 15
+    MAIL_MAX_INTENTOS = 6
+    MAIL_BACKOFF_SEGUNDOS = 30
+    MAIL_BACKOFF_MAX_SEGUNDOS = 3600
+    MAIL_BLOQUEO_MINUTOS = 10
+    MAIL_BARRIDO_SEGUNDOS = int(os.environ.get('MAIL_BARRIDO_SEGUNDOS', '300'))
+    MAIL_RETENCION_DIAS = 7
+
+    # -------------------------------------------------------------------------
+    # Ranking de tendencia (hot_score): pesos por evento y decaimiento exponencial.
+    # `flask tendencia-decaer` se ejecuta por cron (cada TENDENCIA_INTERVALO_HORAS) y decae por
+    # las horas reales desde el anterior; el intervalo solo se usa en el primer decaimiento.
+    # -------------------------------------------------------------------------
+    TENDENCIA_PESO_LIKE = 1.0
+    TENDENCIA_PESO_DISLIKE = -0.5
+    TENDENCIA_PESO_COMENTARIO = 0.5
+    TENDENCIA_PESO_NUEVO = 3.0
+    TENDENCIA_VIDA_MEDIA_HORAS = float(os.environ.get('TENDENCIA_VIDA_MEDIA_HORAS', '72'))
+    TENDENCIA_INTERVALO_HORAS = float(os.environ.get('TENDENCIA_INTERVALO_HORAS', '1'))
+
+    # -------------------------------------------------------------------------
+    # Tiempo real (SSE) para el modal de detalle (ver tiempo_real.py).
+    # SSE_MODO: 'local' (un proceso) o 'sqlite' (varios workers en la misma máquina;
+    # los eventos se comparten mediante la BD local SSE_STORE_PATH).
+    # -------------------------------------------------------------------------
+    SSE_MODO = os.environ.get('SSE_MODO', 'local')
+    SSE_STORE_PATH = os.environ.get('SSE_STORE_PATH', str(BASE_DIR / 'instance' / 'eventos_sse.db'))
+    SSE_MAX_CONEXIONES = int(os.environ.get('SSE_MAX_CONEXIONES', '200'))
+    SSE_MAX_BUFFER = 50
+    SSE_HEARTBEAT_SEGUNDOS = 15
+    SSE_DURACION_MAX_SEGUNDOS = 300
+    SSE_POLL_SEGUNDOS = 0.5
+
+    # -------------------------------------------------------------------------
+    # Publicador estático (publicador.py): páginas públicas pre-renderizadas en
+    # PUBLICADOR_DIR para nginx. Con PUBLICADOR_ACTIVO se reconstruyen tras cada escritura.
+    # -------------------------------------------------------------------------
+    PUBLICADOR_ACTIVO = os.environ.get('PUBLICADOR_ACTIVO', 'false').lower() in ('true', '1', 'yes')
+    PUBLICADOR_DIR = os.environ.get('PUBLICADOR_DIR', str(BASE_DIR / 'publico'))
+    PUBLICADOR_AGRUPAR_SEGUNDOS = 1.0
+
+    # -------------------------------------------------------------------------
+    # Respaldos en línea de la BD (respaldo.py): API de backup de SQLite por pasos.
+    # `flask respaldar` o, con RESPALDO_ACTIVO, un hilo cada RESPALDO_INTERVALO_HORAS.
+    # -------------------------------------------------------------------------
+    RESPALDO_ACTIVO = os.environ.get('RESPALDO_ACTIVO', 'false').lower() in ('true', '1', 'yes')
+    RESPALDO_DIR = os.environ.get('RESPALDO_DIR', str(BASE_DIR / 'instance' / 'respaldos'))
+    RESPALDO_INTERVALO_HORAS = float(os.environ.get('RESPALDO_INTERVALO_HORAS', '24'))
+    RESPALDO_RETENCION = int(os.environ.get('RESPALDO_RETENCION', '7'))
+    RESPALDO_COMPRIMIR = os.environ.get('RESPALDO_COMPRIMIR', 'true').lower() in ('true', '1', 'yes')
+    RESPALDO_PAGINAS_POR_PASO = 256
+    RESPALDO_PAUSA_SEGUNDOS = 0.02
+    RESPALDO_MAX_REINICIOS = 5
+
+    # -------------------------------------------------------------------------
+    # Archivo de años fiscales cerrados (archivo.py): BD SQLite aparte, adjunta en
+    # solo lectura. `flask archivar [--hasta AÑO]` mueve los proyectos antiguos.
+    # -------------------------------------------------------------------------
+    ARCHIVO_PATH = os.environ.get('ARCHIVO_PATH', str(BASE_DIR / 'instance' / 'archivo.db'))
+
+    # -------------------------------------------------------------------------
+    # Reportes (reportes.py): instantánea de solo lectura de la BD (bind `reportes`)
+    # para análisis y exportaciones. `flask reportes-actualizar` o, con
+    # REPORTES_ACTIVO, un hilo cada REPORTES_INTERVALO_MINUTOS.
+    # -------------------------------------------------------------------------
+    REPORTES_PATH = os.environ.get('REPORTES_PATH', str(BASE_DIR / 'instance' / 'reportes.db'))
+    REPORTES_ACTIVO = os.environ.get('REPORTES_ACTIVO', 'false').lower() in ('true', '1', 'yes')
+    REPORTES_INTERVALO_MINUTOS = float(os.environ.get('REPORTES_INTERVALO_MINUTOS', '15'))
+
+    # -------------------------------------------------------------------------
+    # Plantillas (plantillas.py): caché persistente de bytecode de Jinja y
+    # precalentamiento opcional de las rutas principales al crear la app.
+    # -------------------------------------------------------------------------
+    PLANTILLAS_CACHE_DIR = os.environ.get('PLANTILLAS_CACHE_DIR', str(BASE_DIR / 'instance' / 'jinja_cache'))
+    PLANTILLAS_PRECALENTAR = os.environ.get('PLANTILLAS_PRECALENTAR', 'false').lower() in ('true', '1', 'yes')
+
+    # Panel de usuarios (/admin/usuarios y /api/admin/usuarios)
+    USUARIOS_POR_PAGINA = 50
+    # Máximo de ids por operación en lote (/admin/presupuestos/lote, /admin/comentarios/lote)
+    ADMIN_LOTE_MAX = 5000
+
+    # Series de actividad diaria (/api/actividad, /api/presupuesto/<id>/actividad): ?dias=N
+    ACTIVIDAD_DIAS = 90
+    ACTIVIDAD_DIAS_MAX = 730
+
     # Google Maps (opcional)
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
     MAP_LATITUDE = os.environ.get('MAP_LATITUDE', '20.7071')
@@ -0,0 +1,245 @@
+"""
+=============================================================================
+COLA DE CORREO SALIENTE + BARRIDO DE REGISTROS PENDIENTES EXPIRADOS
+=============================================================================
+
+- encolar(): inserta un CorreoSaliente en la sesión actual; se confirma con el
+  commit de la ruta (la petición nunca espera al servidor SMTP).
+- Un hilo en segundo plano por proceso (EnviadorCorreo) reclama lotes con un
+  UPDATE atómico (varios workers no envían el mismo correo), los manda por UNA
+  conexión SMTP reutilizada y reprograma los fallidos con backoff exponencial.
+- Otro hilo (BarridoExpirados), activo aunque la cola no lo esté, ejecuta cada
+  MAIL_BARRIDO_SEGUNDOS barrer_expirados(): DELETE en lote de pending_registro
+  vencidos (índice en creado_at) y de correos ya enviados antiguos.
+
+Para probar en local sin Gmail: levantar un SMTP de prueba
+(`python -m aiosmtpd -n -l localhost:1025`) y usar MAIL_SERVER=localhost,
+MAIL_PORT=1025, MAIL_USE_TLS=false, MAIL_COLA_ACTIVA=true.
+"""
+
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import CorreoSaliente, PendingRegistro
+
+
+def encolar(destinatario, asunto, cuerpo):
+    """Agrega un correo a la cola (sin commit: lo confirma la transacción de la ruta)."""
+    correo = CorreoSaliente(destinatario=destinatario, asunto=asunto, cuerpo=cuerpo)
+    db.session.add(correo)
+    # El hilo se despierta tras el commit (ver _despertar_tras_commit)
+    db.session.info['correo_encolado'] = True
+    return correo
+
+
+def _reclamar_lote(tamano, bloqueo_minutos):
+    """
+    Marca como 'enviando' hasta `tamano` correos listos y retorna los reclamados.
+    Los que quedaron en 'enviando' más de bloqueo_minutos (worker caído) se liberan.
+    """
+    ahora = datetime.utcnow()
+    db.session.execute(
+        update(CorreoSaliente)
+        .where(CorreoSaliente.estado == 'enviando', CorreoSaliente.actualizado_at < ahora - timedelta(minutes=bloqueo_minutos))
+        .values(estado='pendiente', lote=None)
+    )
+    token = uuid.uuid4().hex
+    ids = (
+        select(CorreoSaliente.id)
+        .where(CorreoSaliente.estado == 'pendiente', CorreoSaliente.proximo_intento <= ahora)
+        .order_by(CorreoSaliente.id)
+        .limit(tamano)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(CorreoSaliente)
+        .where(CorreoSaliente.id.in_(ids), CorreoSaliente.estado == 'pendiente')
+        .values(estado='enviando', lote=token, actualizado_at=ahora)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return CorreoSaliente.query.filter_by(lote=token, estado='enviando').order_by(CorreoSaliente.id).all()
+
+
+def _reprogramar(correo, error, config):
+    """Reintento con backoff exponencial; tras MAIL_MAX_INTENTOS queda 'fallido'."""
+    correo.intentos += 1
+    correo.ultimo_error = str(error)[:300]
+    correo.lote = None
+    correo.actualizado_at = datetime.utcnow()
+    if correo.intentos >= config['MAIL_MAX_INTENTOS']:
+        correo.estado = 'fallido'
+        return
+    espera = min(config['MAIL_BACKOFF_SEGUNDOS'] * (2 ** (correo.intentos - 1)), config['MAIL_BACKOFF_MAX_SEGUNDOS'])
+    correo.estado = 'pendiente'
+    correo.proximo_intento = datetime.utcnow() + timedelta(seconds=espera)
+
+
+def _conectar_smtp(config):
+    smtp = smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT_SEGUNDOS'])
+    if config['MAIL_USE_TLS']:
+        smtp.starttls()
+    if config['MAIL_USERNAME']:
+        smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+    return smtp
+
+
+def procesar_cola(config):
+    """
+    Envía un lote de la cola por una sola conexión SMTP. Retorna (enviados, fallidos).
+    Si la conexión falla, todo el lote se reprograma.
+    """
+    lote = _reclamar_lote(config['MAIL_LOTE'], config['MAIL_BLOQUEO_MINUTOS'])
+    if not lote:
+        return 0, 0
+    enviados = fallidos = 0
+    try:
+        smtp = _conectar_smtp(config)
+    except (smtplib.SMTPException, OSError) as e:
+        for correo in lote:
+            _reprogramar(correo, e, config)
+        db.session.commit()
+        return 0, len(lote)
+    try:
+        for correo in lote:
+            msg = EmailMessage()
+            msg['From'] = config['MAIL_DEFAULT_SENDER']
+            msg['To'] = correo.destinatario
+            msg['Subject'] = correo.asunto
+            msg.set_content(correo.cuerpo)
+            try:
+                smtp.send_message(msg)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                # Rechazo de este mensaje: la conexión sigue sirviendo para el resto
+                _reprogramar(correo, e, config)
+                fallidos += 1
+            except (smtplib.SMTPException, OSError) as e:
+                # Conexión perdida: este y el resto del lote se reintentan más tarde
+                for pendiente in lote[lote.index(correo):]:
+                    _reprogramar(pendiente, e, config)
+                    fallidos += 1
+                break
+            else:
+                correo.estado = 'enviado'
+                correo.enviado_at = correo.actualizado_at = datetime.utcnow()
+                correo.lote = None
+                enviados += 1
+    finally:
+        db.session.commit()
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    return enviados, fallidos
+
+
+def barrer_expirados(config):
+    """
+    DELETE en lote de pending_registro con código vencido y de correos enviados
+    más antiguos que MAIL_RETENCION_DIAS. Retorna (registros, correos) eliminados.
+    """
+    ahora = datetime.utcnow()
+    limite = ahora - timedelta(minutes=config['VERIFICATION_CODE_EXPIRY_MINUTES'])
+    registros = db.session.execute(delete(PendingRegistro).where(PendingRegistro.creado_at < limite)).rowcount
+    correos = db.session.execute(
+        delete(CorreoSaliente).where(
+            CorreoSaliente.estado == 'enviado',
+            CorreoSaliente.enviado_at < ahora - timedelta(days=config['MAIL_RETENCION_DIAS']),
+        )
+    ).rowcount
+    db.session.commit()
+    return registros, correos
+
+
+class EnviadorCorreo:
+    """Hilo daemon por proceso: procesa la cola (solo con MAIL_COLA_ACTIVA)."""
+
+    def __init__(self):
+        self.app = None
+        self._evento = threading.Event()
+        self._hilo = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('MAIL_COLA_ACTIVA'):
+            event.listen(Session, 'after_commit', _despertar_tras_commit)
+            self.iniciar()
+
+    def despertar(self):
+        self._evento.set()
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name='cola-correo')
+            self._hilo.start()
+
+    def _bucle(self):
+        config = self.app.config
+        while True:
+            self._evento.wait(config['MAIL_INTERVALO_SEGUNDOS'])
+            self._evento.clear()
+            with self.app.app_context():
+                try:
+                    # Vaciar la cola mientras haya lotes completos listos
+                    while True:
+                        enviados, fallidos = procesar_cola(config)
+                        if enviados + fallidos < config['MAIL_LOTE']:
+                            break
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('[cola-correo] Error al procesar la cola')
+                finally:
+                    db.session.remove()
+
+
+class BarridoExpirados:
+    """
+    Hilo daemon por proceso: barrer_expirados() cada MAIL_BARRIDO_SEGUNDOS, con o sin
+    cola de envío (MAIL_BARRIDO_SEGUNDOS = 0 lo desactiva). Los DELETE son idempotentes:
+    varios workers pueden barrer a la vez.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._hilo = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('MAIL_BARRIDO_SEGUNDOS'):
+            self.iniciar()
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name='barrido-correo')
+            self._hilo.start()
+
+    def _bucle(self):
+        config = self.app.config
+        while True:
+            time.sleep(config['MAIL_BARRIDO_SEGUNDOS'])
+            with self.app.app_context():
+                try:
+                    barrer_expirados(config)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('[barrido-correo] Error al barrer registros expirados')
+                finally:
+                    db.session.remove()
+
+
+enviador = EnviadorCorreo()
+barrido = BarridoExpirados()
+
+
+def _despertar_tras_commit(session):
+    """Despierta al hilo de envío cuando se confirma una transacción que encoló correos."""
+    if session.info.pop('correo_encolado', False):
+        enviador.despertar()
@@ -35,7 +35,8 @@ class Usuario(UserMixin, db.Model):
     es_super_admin = db.Column(db.Boolean, default=False, nullable=False)
 
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
-    votos = db.relationship('VotoPresupuesto', backref='usuario', lazy='dynamic')
+    # Los votos se borran en la BD (ON DELETE CASCADE) al eliminar al usuario
+    votos = db.relationship('VotoPresupuesto', backref='usuario', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
 
     def set_password(self, password):
         """
@@ -68,6 +69,24 @@ class Usuario(UserMixin, db.Model):
         return self.es_super_admin
 
 
+# =============================================================================
+# MODELO: Categoria
+# Catálogo de categorías de proyectos (antes lista fija CATEGORIAS en app.py).
+# Presupuesto y ResumenArchivo guardan solo el id; los administradores las
+# gestionan en /admin/categorias.
+# =============================================================================
+
+class Categoria(db.Model):
+    __tablename__ = 'categorias'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(100), unique=True, nullable=False)
+    orden = db.Column(db.Integer, default=0, nullable=False)  # Orden en filtros y formularios
+
+    def __repr__(self):
+        return f'<Categoria {self.nombre}>'
+
+
 # =============================================================================
 # MODELO: Presupuesto (Proyecto)
 # Representa cada proyecto o ítem presupuestario con imagen, fecha, descripción y reacciones.
@@ -81,9 +100,13 @@ class Presupuesto(db.Model):
     - descripcion_corta: Texto breve para la tarjeta (card) en carrusel y grid.
     - descripcion: Descripción larga para el modal detallado.
     - likes / dislikes: Contadores de reacciones (públicos, sin restricción por usuario).
+    - hot_score: Puntuación de tendencia (likes, dislikes, comentarios y recencia).
+    - resumen_card: Resumen ya truncado para las cards (ver actualizar_resumen).
     """
     __tablename__ = 'presupuestos'
 
+    RESUMEN_LARGO = 120
+
     # Clave primaria
     id = db.Column(db.Integer, primary_key=True)
 
@@ -91,11 +114,15 @@ class Presupuesto(db.Model):
     concepto = db.Column(db.String(200), nullable=False)  # Título del proyecto
     descripcion_corta = db.Column(db.String(300))  # Resumen breve para la card (si vacío se trunca descripcion)
     descripcion = db.Column(db.Text)  # Descripción larga para el modal
+    # Resumen precalculado para cards (descripcion_corta o descripcion truncada a RESUMEN_LARGO).
+    # Se llena al crear/editar; los listados lo leen sin cargar descripcion (Text).
+    resumen_card = db.Column(db.String(130))
     imagen_url = db.Column(db.String(500))  # Ruta o URL de imagen (ej: img/proyecto1.jpg)
 
     # Datos presupuestarios
     monto = db.Column(db.Float, nullable=False)
-    categoria = db.Column(db.String(100), nullable=False)
+    # Categoría normalizada (tabla categorias); el nombre se lee de la caché de categorias.py
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), nullable=False)
     fecha = db.Column(db.Date, nullable=False)  # Fecha del proyecto
 
     # Gasto (gamificación): solo se define al crear la tarjeta; no editable después.
@@ -106,11 +133,48 @@ class Presupuesto(db.Model):
     likes = db.Column(db.Integer, default=0, nullable=False)
     dislikes = db.Column(db.Integer, default=0, nullable=False)
 
+    # Ranking de tendencia (ver tendencia.py): se actualiza en cada voto/comentario y
+    # se re-decae periódicamente en lote. Indexado para servir ?orden=tendencia.
+    hot_score = db.Column(db.Float, default=0, nullable=False, index=True)
+
     # Auditoría
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
 
-    comentarios = db.relationship('Comentario', backref='presupuesto', lazy='dynamic', order_by='Comentario.fecha_creacion')
-    votos = db.relationship('VotoPresupuesto', backref='presupuesto', lazy='dynamic', foreign_keys='VotoPresupuesto.presupuesto_id')
+    # Comentarios y votos se borran en la BD (ON DELETE CASCADE, PRAGMA foreign_keys=ON),
+    # también con DELETE en lote: el ORM no los carga ni los borra uno por uno.
+    comentarios = db.relationship('Comentario', backref='presupuesto', lazy='dynamic', order_by='Comentario.fecha_creacion',
+                                  cascade='all, delete-orphan', passive_deletes=True)
+    votos = db.relationship('VotoPresupuesto', backref='presupuesto', lazy='dynamic', foreign_keys='VotoPresupuesto.presupuesto_id',
+                            cascade='all, delete-orphan', passive_deletes=True)
+
+    # Índice cubriente para filtros y facetas por categoría/año (catalogo.py):
+    # los GROUP BY se resuelven solo con el índice, sin leer las filas.
+    # AUTOINCREMENT: un id nunca se reutiliza (los proyectos archivados conservan el suyo, ver archivo.py).
+    __table_args__ = (
+        db.Index('ix_presupuestos_categoria_id_fecha_monto', 'categoria_id', 'fecha', 'monto'),
+        {'sqlite_autoincrement': True},
+    )
+
+    @staticmethod
+    def truncar(texto, largo):
+        """Trunca texto a largo caracteres añadiendo '...' si se corta."""
+        if texto and len(texto) > largo:
+            return texto[:largo] + '...'
+        return texto
+
+    def actualizar_resumen(self):
+        """Recalcula resumen_card desde descripcion_corta o descripcion. Llamar al crear/editar."""
+        self.resumen_card = self.truncar(self.descripcion_corta or self.descripcion, self.RESUMEN_LARGO) or None
+
+    @property
+    def categoria(self):
+        """Nombre de la categoría (caché en memoria; no consulta la BD por fila)."""
+        import categorias
+        return categorias.nombre(self.categoria_id)
+
+    def resumen(self, largo=RESUMEN_LARGO):
+        """Resumen de card a largo caracteres (<= RESUMEN_LARGO) derivado de resumen_card, sin leer descripcion."""
+        return self.truncar(self.resumen_card, largo) or ''
 
     def __repr__(self):
         """Representación en consola para debugging."""
@@ -126,7 +190,7 @@ class Comentario(db.Model):
     __tablename__ = 'comentarios'
 
     id = db.Column(db.Integer, primary_key=True)
-    presupuesto_id = db.Column(db.Integer, db.ForeignKey('presupuestos.id'), nullable=False)
+    presupuesto_id = db.Column(db.Integer, db.ForeignKey('presupuestos.id', ondelete='CASCADE'), nullable=False, index=True)
     autor = db.Column(db.String(120), default='Anónimo')
     contenido = db.Column(db.Text, nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
@@ -146,7 +210,35 @@ class PendingRegistro(db.Model):
     nombre = db.Column(db.String(100), nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     codigo = db.Column(db.String(6), nullable=False)  # Código de 6 dígitos enviado por correo
+    # Indexado: el barrido periódico (correo.barrer_expirados) borra en lote los vencidos
+    creado_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# =============================================================================
+# MODELO: CorreoSaliente
+# Cola persistente de correos salientes (patrón outbox). Las rutas solo insertan
+# la fila dentro de su transacción; un hilo en segundo plano (correo.py) los envía
+# en lotes por una sola conexión SMTP, con reintentos y backoff exponencial.
+# estado: 'pendiente' -> 'enviando' -> 'enviado' | 'fallido'.
+# =============================================================================
+
+class CorreoSaliente(db.Model):
+    __tablename__ = 'correos_salientes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(120), nullable=False)
+    asunto = db.Column(db.String(200), nullable=False)
+    cuerpo = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(12), default='pendiente', nullable=False)
+    intentos = db.Column(db.Integer, default=0, nullable=False)
+    proximo_intento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    ultimo_error = db.Column(db.String(300))
+    lote = db.Column(db.String(32))  # Token del worker que reclamó el envío
     creado_at = db.Column(db.DateTime, default=datetime.utcnow)
+    actualizado_at = db.Column(db.DateTime, default=datetime.utcnow)
+    enviado_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_correos_salientes_estado_proximo', 'estado', 'proximo_intento'),)
 
 
 # =============================================================================
@@ -160,14 +252,70 @@ class VotoPresupuesto(db.Model):
     __tablename__ = 'votos_presupuesto'
 
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
-    presupuesto_id = db.Column(db.Integer, db.ForeignKey('presupuestos.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
+    # Indexado: el ON DELETE CASCADE desde presupuestos lo usa (el UNIQUE empieza por usuario_id)
+    presupuesto_id = db.Column(db.Integer, db.ForeignKey('presupuestos.id', ondelete='CASCADE'), nullable=False, index=True)
     tipo = db.Column(db.String(10), nullable=False)  # 'like' o 'dislike'
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (db.UniqueConstraint('usuario_id', 'presupuesto_id', name='uq_usuario_presupuesto'),)
 
 
+# =============================================================================
+# MODELO: EstadoCatalogo
+# Una sola fila (id=1) con la versión del catálogo de presupuestos. Se incrementa
+# en cada alta/edición/baja; las cachés derivadas (facetas, etc.) se invalidan
+# al cambiar la versión, también entre varios workers.
+# =============================================================================
+
+class EstadoCatalogo(db.Model):
+    __tablename__ = 'estado_catalogo'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Hasta cuándo está decaído hot_score (tendencia.decaer decae por las horas reales desde aquí)
+    tendencia_decaida_at = db.Column(db.DateTime, nullable=True)
+
+
+# =============================================================================
+# MODELO: ResumenArchivo
+# Totales por año y categoría de los proyectos movidos a la BD de archivo
+# (archivo.py). Mantiene el total de la navbar y las facetas sin leer el archivo.
+# =============================================================================
+
+class ResumenArchivo(db.Model):
+    __tablename__ = 'resumen_archivo'
+
+    anio = db.Column(db.Integer, primary_key=True)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), primary_key=True)
+    proyectos = db.Column(db.Integer, default=0, nullable=False)
+    monto = db.Column(db.Float, default=0, nullable=False)
+    cantidad_gasto = db.Column(db.Float, default=0, nullable=False)
+    archivado_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# =============================================================================
+# MODELO: ActividadDiaria
+# Serie de tiempo por proyecto y día (UTC): votos nuevos (likes/dislikes), cambios
+# de voto y comentarios. Se mantiene de forma incremental (actividad.py) para que
+# los gráficos no recorran votos_presupuesto y comentarios.
+# =============================================================================
+
+class ActividadDiaria(db.Model):
+    __tablename__ = 'actividad_diaria'
+
+    presupuesto_id = db.Column(db.Integer, db.ForeignKey('presupuestos.id', ondelete='CASCADE'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    dislikes = db.Column(db.Integer, default=0, nullable=False)
+    cambios = db.Column(db.Integer, default=0, nullable=False)
+    comentarios = db.Column(db.Integer, default=0, nullable=False)
+
+    # Índice cubriente para la serie global (SUM ... GROUP BY dia sin leer la tabla)
+    __table_args__ = (db.Index('ix_actividad_diaria_dia', 'dia', 'likes', 'dislikes', 'cambios', 'comentarios'),)
+
+
 # =============================================================================
 # MODELO: CarruselSlide (Edición in-place - Franja 1)
 # Imágenes del carrusel de la página de inicio; el admin puede Editar/Subir.
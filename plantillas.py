@@ -0,0 +1,66 @@
+"""
+=============================================================================
+PLANTILLAS: caché de bytecode de Jinja, precompilación y precalentamiento
+=============================================================================
+
+- init_app(): FileSystemBytecodeCache en PLANTILLAS_CACHE_DIR. Un worker nuevo
+  carga el bytecode ya compilado en vez de compilar cada plantilla al primer
+  acceso (la caché se invalida sola si cambia el código fuente de la plantilla).
+- compilar(): `flask plantillas-compilar` compila todas las plantillas y escribe
+  su bytecode. compilar_si_falta() lo hace al crear la app cuando la caché está
+  vacía (contenedor nuevo), en el mismo proceso que luego atiende tráfico.
+- precalentar(): con PLANTILLAS_PRECALENTAR, create_app renderiza una vez las
+  rutas principales (como visitante anónimo) antes de que el worker atienda
+  tráfico: plantillas en memoria, conexiones abiertas y cachés de categorías y
+  facetas llenas.
+"""
+
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+from models import Presupuesto
+
+RUTAS_PRECALENTAR = ('/', '/presupuestos', '/auth/login')
+
+
+def init_app(app):
+    """Debe llamarse antes del primer uso de app.jinja_env."""
+    directorio = app.config.get('PLANTILLAS_CACHE_DIR')
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directorio)}
+
+
+def compilar(app):
+    """Compila todas las plantillas .html (regenera su bytecode). Retorna (plantillas, segundos)."""
+    inicio = time.monotonic()
+    entorno = app.jinja_env
+    if entorno.bytecode_cache is not None:
+        entorno.bytecode_cache.clear()
+    if entorno.cache is not None:
+        # Las ya cargadas en memoria no volverían a escribir su bytecode
+        entorno.cache.clear()
+    nombres = [n for n in entorno.list_templates() if n.endswith('.html')]
+    for nombre in nombres:
+        entorno.get_template(nombre)
+    return len(nombres), round(time.monotonic() - inicio, 3)
+
+
+def compilar_si_falta(app):
+    """Compila las plantillas si PLANTILLAS_CACHE_DIR no tiene bytecode. Retorna (plantillas, segundos) o None."""
+    directorio = app.config.get('PLANTILLAS_CACHE_DIR')
+    if not directorio or os.listdir(directorio):
+        return None
+    return compilar(app)
+
+
+def precalentar(app):
+    """Renderiza las rutas principales y el detalle del proyecto más reciente. Retorna {url: status}."""
+    with app.app_context():
+        ultimo = Presupuesto.query.with_entities(Presupuesto.id).order_by(Presupuesto.id.desc()).first()
+    urls = list(RUTAS_PRECALENTAR) + ([f'/presupuesto/{ultimo.id}', f'/api/presupuesto/{ultimo.id}'] if ultimo else [])
+    cliente = app.test_client(use_cookies=False)
+    return {url: cliente.get(url).status_code for url in urls}
@@ -0,0 +1,298 @@
+"""
+=============================================================================
+PUBLICADOR ESTÁTICO
+Pre-renderiza las páginas públicas en archivos HTML/JSON que puede servir
+nginx (o cualquier hosting estático) sin pasar por Python.
+=============================================================================
+
+Páginas publicadas (vista de visitante anónimo):
+- /                                        -> index__.html
+- /presupuestos[?categoria=&anio=&orden=]  -> presupuestos/index__.html, presupuestos/index__<query>.html
+- /presupuesto/<id>                        -> presupuesto/<id>/index__.html
+- /api/presupuesto/<id>                    -> api/presupuesto/<id>/index__.json
+
+El nombre lleva la query tal cual ($args de nginx) en orden canónico (categoria,
+anio, orden; sin parámetros vacíos ni orden=likes), codificada con urlencode. Una
+query sin archivo (no canónica o no publicada) la atiende la app, que redirige el
+listado a su URL canónica. Ejemplo de nginx (solo visitantes sin cookie de sesión):
+
+    location / {
+        if ($cookie_session) { proxy_pass http://app; }
+        try_files /publico$uri/index__$args.html /publico$uri/index__$args.json @app;
+    }
+
+El token CSRF no se publica (meta vacía); el JS lo pide a /api/csrf cuando lo necesita.
+
+Reconstrucción:
+- Incremental: tras cada escritura las rutas llaman a encolar_*; un hilo en
+  segundo plano agrupa las URLs afectadas y solo re-renderiza esas. Las bajas
+  pasan las URLs que tenía el proyecto (encolar_bajas) para borrar sus archivos
+  y rehacer sus listados; una reconstrucción "todo" borra además los archivos
+  que ya no corresponden a ninguna página.
+- Completa: `flask publicar [--procesos N]` reparte las URLs entre procesos.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from urllib.parse import urlencode
+
+from sqlalchemy import func
+
+import categorias
+from extensions import db
+from models import Presupuesto
+
+_CSRF_META = re.compile(rb'(<meta name="csrf-token" content=")[^"]*(")')
+
+
+# -----------------------------------------------------------------------------
+# URLs y rutas de archivo
+# -----------------------------------------------------------------------------
+
+ORDENES = ('likes', 'tendencia')  # El primero es el orden por defecto (no va en la URL)
+
+
+def url_listado(categoria=None, anio=None, orden=None):
+    """URL canónica del listado con filtros (mismo orden que espera nginx)."""
+    if orden == ORDENES[0]:
+        orden = None
+    args = [(k, v) for k, v in (('categoria', categoria), ('anio', anio), ('orden', orden)) if v]
+    return '/presupuestos' + ('?' + urlencode(args) if args else '')
+
+
+def _en_todos_los_ordenes(categoria=None, anio=None):
+    return [url_listado(categoria, anio, orden) for orden in ORDENES]
+
+
+def archivo_para(url, directorio, es_json=False):
+    """Ruta del archivo estático que corresponde a una URL pública."""
+    ruta, _, query = url.partition('?')
+    nombre = 'index__' + query + ('.json' if es_json else '.html')
+    return os.path.join(directorio, ruta.strip('/'), nombre)
+
+
+def urls_presupuesto(p):
+    """Detalle y JSON de un presupuesto."""
+    return [f'/presupuesto/{p.id}', f'/api/presupuesto/{p.id}']
+
+
+def urls_listados_de(categoria, fecha):
+    """Listados en los que aparece un presupuesto de esa categoría y fecha."""
+    anio = fecha.year if fecha else None
+    urls = ['/']
+    for c, a in ((None, None), (categoria, None), (None, anio), (categoria, anio)):
+        urls += _en_todos_los_ordenes(c, a)
+    return urls
+
+
+def todas_las_urls():
+    """Todas las páginas públicas a partir de los datos actuales."""
+    urls = ['/'] + _en_todos_los_ordenes()
+    anio_col = func.strftime('%Y', Presupuesto.fecha)
+    combinaciones = [
+        (categorias.nombre(cid), a)
+        for cid, a in db.session.query(Presupuesto.categoria_id, anio_col).distinct()
+    ]
+    nombres = sorted({c for c, _ in combinaciones})
+    anios = sorted({int(a) for _, a in combinaciones if a})
+    for c in nombres:
+        urls += _en_todos_los_ordenes(c)
+    for a in anios:
+        urls += _en_todos_los_ordenes(None, a)
+    for c, a in combinaciones:
+        if a:
+            urls += _en_todos_los_ordenes(c, int(a))
+    for (pid,) in db.session.query(Presupuesto.id):
+        urls += [f'/presupuesto/{pid}', f'/api/presupuesto/{pid}']
+    return urls
+
+
+# -----------------------------------------------------------------------------
+# Renderizado
+# -----------------------------------------------------------------------------
+
+def _escribir(ruta, contenido):
+    """Escritura atómica: nunca se sirve un archivo a medio escribir."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = ruta + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(contenido)
+    os.replace(tmp, ruta)
+
+
+def _borrar(url, directorio):
+    for es_json in (False, True):
+        ruta = archivo_para(url, directorio, es_json)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def renderizar(app, urls, directorio):
+    """
+    Renderiza las URLs como visitante anónimo y escribe los archivos.
+    Las que ya no existen (404) o redirigen (proyecto archivado) se borran.
+    Retorna la lista de archivos escritos.
+    """
+    escritos = []
+    cliente = app.test_client(use_cookies=False)
+    for url in urls:
+        resp = cliente.get(url)
+        if resp.status_code in (301, 302, 404):
+            _borrar(url, directorio)
+            continue
+        if resp.status_code != 200:
+            continue
+        es_json = resp.mimetype == 'application/json'
+        contenido = resp.get_data()
+        if not es_json:
+            contenido = _CSRF_META.sub(rb'\1\2', contenido)
+        ruta = archivo_para(url, directorio, es_json)
+        _escribir(ruta, contenido)
+        escritos.append(ruta)
+    return escritos
+
+
+_app_worker = None
+
+
+def _renderizar_en_worker(urls, directorio):
+    """Tarea de un proceso del pool (la app se hereda por fork)."""
+    return renderizar(_app_worker, urls, directorio)
+
+
+def _iniciar_worker():
+    # Las conexiones SQLite no deben compartirse entre procesos
+    with _app_worker.app_context():
+        db.engine.dispose()
+
+
+def publicar_todo(app, procesos=None):
+    """
+    Reconstrucción completa en paralelo (procesos fork). Borra los archivos que
+    ya no corresponden a ninguna página. Retorna el número de archivos escritos.
+    """
+    global _app_worker
+    directorio = app.config['PUBLICADOR_DIR']
+    with app.app_context():
+        urls = todas_las_urls()
+        db.engine.dispose()
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and 'fork' in get_all_start_methods():
+        _app_worker = app
+        partes = [urls[i::procesos] for i in range(procesos)]
+        with ProcessPoolExecutor(procesos, mp_context=get_context('fork'), initializer=_iniciar_worker) as pool:
+            escritos = [r for lote in pool.map(_renderizar_en_worker, partes, [directorio] * procesos) for r in lote]
+    else:
+        escritos = renderizar(app, urls, directorio)
+
+    podar(directorio, escritos)
+    return len(escritos)
+
+
+def podar(directorio, vigentes):
+    """Borra los .html/.json publicados que no están en `vigentes` (páginas que ya no existen)."""
+    vigentes = set(vigentes)
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            if ruta not in vigentes and nombre.endswith(('.html', '.json')):
+                os.remove(ruta)
+
+
+# -----------------------------------------------------------------------------
+# Reconstrucción incremental en segundo plano
+# -----------------------------------------------------------------------------
+
+class Publicador:
+    """Hilo que agrupa las URLs afectadas por escrituras y las re-renderiza."""
+
+    def __init__(self):
+        self.app = None
+        self.activo = False
+        self._pendientes = set()
+        self._todo = False
+        self._cond = threading.Condition()
+        self._hilo = None
+
+    def init_app(self, app):
+        self.app = app
+        self.activo = bool(app.config.get('PUBLICADOR_ACTIVO'))
+
+    def encolar(self, urls):
+        if not self.activo:
+            return
+        with self._cond:
+            self._pendientes.update(urls)
+            self._cond.notify()
+        self._iniciar()
+
+    def encolar_todo(self, urls=()):
+        if not self.activo:
+            return
+        with self._cond:
+            self._todo = True
+            self._pendientes.update(urls)
+            self._cond.notify()
+        self._iniciar()
+
+    def _iniciar(self):
+        if self._hilo is None:
+            with self._cond:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._bucle, daemon=True, name='publicador')
+                    self._hilo.start()
+
+    def _bucle(self):
+        espera = self.app.config.get('PUBLICADOR_AGRUPAR_SEGUNDOS', 1.0)
+        while True:
+            with self._cond:
+                while not self._pendientes and not self._todo:
+                    self._cond.wait()
+            # Agrupar ráfagas de votos/comentarios en una sola reconstrucción
+            threading.Event().wait(espera)
+            with self._cond:
+                urls, todo = self._pendientes, self._todo
+                self._pendientes, self._todo = set(), False
+            try:
+                directorio = self.app.config['PUBLICADOR_DIR']
+                with self.app.app_context():
+                    if todo:
+                        urls = set(todas_las_urls()) | urls
+                    escritos = renderizar(self.app, sorted(urls), directorio)
+                if todo:
+                    podar(directorio, escritos)
+            except Exception:
+                self.app.logger.exception('[publicador] Error al publicar las páginas estáticas')
+
+
+publicador = Publicador()
+
+
+def encolar_presupuesto(p):
+    """Votos y comentarios: detalle + JSON + listados que contienen el proyecto."""
+    publicador.encolar(urls_presupuesto(p) + urls_listados_de(p.categoria, p.fecha))
+
+
+def encolar_todo():
+    """Altas y ediciones de catálogo (total de la navbar y facetas de todos los listados)."""
+    publicador.encolar_todo()
+
+
+def urls_de(filas):
+    """
+    URLs publicadas de proyectos (filas con id, categoria_id y fecha).
+    Tomarlas ANTES de borrarlos o moverlos: después ya no se sabe en qué listados estaban.
+    """
+    urls = set()
+    for p in filas:
+        urls.update(urls_presupuesto(p))
+        urls.update(urls_listados_de(categorias.nombre(p.categoria_id), p.fecha))
+    return urls
+
+
+def encolar_bajas(urls):
+    """Bajas, archivado y cambios de categoría: todo + las URLs anteriores (sus 404 se borran)."""
+    publicador.encolar_todo(urls)
@@ -0,0 +1,270 @@
+"""
+=============================================================================
+REPORTES: instantánea de solo lectura para consultas pesadas
+=============================================================================
+
+Los agregados y exportaciones completas sobre instance/escuela.db mantienen
+transacciones de lectura largas que retrasan las escrituras de votos y
+comentarios. Estas consultas van a una copia, REPORTES_PATH:
+
+- actualizar(): copia la BD con la API de backup (respaldo.copiar_en_linea: por
+  pasos, sin bloquear a la app), copia las tablas de ARCHIVO_PATH (años cerrados)
+  como archivo_<tabla>, guarda la hora en la tabla `instantanea`, ejecuta ANALYZE
+  y reemplaza el archivo de forma atómica (os.replace).
+- Bind `reportes` de Flask-SQLAlchemy: la instantánea en solo lectura (mode=ro)
+  con NullPool, así cada petición abre el archivo vigente.
+- tabla(): activos UNION ALL archivados, con la columna `archivado`, para que los
+  reportes y exportaciones incluyan los años archivados.
+- @ruta: las rutas de reportes y exportación consultan con ejecutar() (una sola
+  conexión por petición, siempre la instantánea) y su respuesta lleva la hora de la
+  instantánea en X-Reporte-Generado. Si aún no existe responden 503 y la primera se
+  genera en segundo plano (nunca dentro de la petición).
+- Con REPORTES_ACTIVO un hilo la renueva cada REPORTES_INTERVALO_MINUTOS (solo un
+  worker, con archivo de bloqueo); si no, `flask reportes-actualizar` por cron.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+from flask import current_app, g, jsonify, make_response
+from sqlalchemy import MetaData, false, select, text, true, union_all
+from sqlalchemy.pool import NullPool
+
+import respaldo
+from extensions import db
+
+BIND = 'reportes'
+EXPORTABLES = ('presupuestos', 'votos_presupuesto', 'comentarios')
+_PREFIJO_ARCHIVO = 'archivo_'
+_BLOQUEO_VENCIDO_SEGUNDOS = 3600
+_metadata_archivo = MetaData()
+
+
+def init_app(app):
+    """Agrega el bind `reportes`. Debe llamarse antes de db.init_app."""
+    ruta = os.path.abspath(app.config['REPORTES_PATH'])
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[BIND] = {'url': f'sqlite:///{Path(ruta).as_uri()}?mode=ro&uri=true', 'poolclass': NullPool}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.teardown_appcontext(_cerrar)
+
+
+# -----------------------------------------------------------------------------
+# Generación de la instantánea
+# -----------------------------------------------------------------------------
+
+def _copiar_archivo(conn, ruta_archivo):
+    """
+    Copia las tablas del archivo como archivo_<tabla> con las mismas columnas que la
+    tabla activa (NULL en las que el archivo aún no tiene). Retorna {tabla: filas}.
+    """
+    conn.execute('ATTACH DATABASE ? AS archivo', (ruta_archivo,))
+    filas = {}
+    try:
+        for tabla in EXPORTABLES:
+            archivadas = {fila[1] for fila in conn.execute(f'PRAGMA archivo.table_info({tabla})')}
+            if not archivadas:
+                continue
+            columnas = ', '.join(
+                c if c in archivadas else f'NULL AS {c}'
+                for c in (fila[1] for fila in conn.execute(f'PRAGMA main.table_info({tabla})'))
+            )
+            conn.execute(f'CREATE TABLE {_PREFIJO_ARCHIVO}{tabla} AS SELECT {columnas} FROM archivo.{tabla}')
+            filas[_PREFIJO_ARCHIVO + tabla] = conn.execute(f'SELECT COUNT(*) FROM {_PREFIJO_ARCHIVO}{tabla}').fetchone()[0]
+        conn.commit()
+    finally:
+        conn.execute('DETACH DATABASE archivo')
+    return filas
+
+
+def actualizar(config):
+    """Genera la instantánea. Retorna {'archivo', 'generada', 'filas', 'reinicios', 'segundos'}."""
+    inicio = time.monotonic()
+    destino = config['REPORTES_PATH']
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    origen = respaldo.ruta_bd()
+    tmp = destino + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        filas, reinicios = respaldo.copiar_en_linea(origen, tmp, config)
+        generada = datetime.utcnow().isoformat(timespec='seconds')
+        conn = sqlite3.connect(tmp, timeout=30)
+        try:
+            # Sin WAL: una conexión mode=ro no podría crear los archivos -wal/-shm
+            conn.execute('PRAGMA journal_mode = DELETE')
+            ruta_archivo = config.get('ARCHIVO_PATH')
+            if ruta_archivo and os.path.exists(ruta_archivo):
+                filas.update(_copiar_archivo(conn, ruta_archivo))
+            conn.execute('CREATE TABLE instantanea (generada_at TEXT NOT NULL, origen TEXT NOT NULL)')
+            conn.execute('INSERT INTO instantanea (generada_at, origen) VALUES (?, ?)', (generada, origen))
+            conn.commit()
+            # Estadísticas para el planificador de las consultas ad hoc
+            conn.execute('ANALYZE')
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {
+        'archivo': destino,
+        'generada': generada,
+        'filas': filas,
+        'reinicios': reinicios,
+        'segundos': round(time.monotonic() - inicio, 2),
+    }
+
+
+def _tomar_bloqueo(config):
+    """Archivo de bloqueo (O_EXCL) para que un solo proceso genere la instantánea."""
+    ruta = config['REPORTES_PATH'] + '.lock'
+    if os.path.exists(ruta) and time.time() - os.path.getmtime(ruta) > _BLOQUEO_VENCIDO_SEGUNDOS:
+        os.remove(ruta)
+    try:
+        os.close(os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return ruta
+    except FileExistsError:
+        return None
+
+
+class SinInstantanea(Exception):
+    """La instantánea aún no existe (se está generando en segundo plano)."""
+
+
+def asegurar(config):
+    """Lanza SinInstantanea si la instantánea aún no existe, tras pedir que se genere en segundo plano."""
+    if not os.path.exists(config['REPORTES_PATH']):
+        actualizador.generar()
+        raise SinInstantanea()
+
+
+# -----------------------------------------------------------------------------
+# Consultas (bind `reportes`)
+# -----------------------------------------------------------------------------
+
+def _conexion():
+    """Conexión a la instantánea de la petición actual (la misma durante toda la petición)."""
+    if '_reportes_conn' not in g:
+        g._reportes_conn = db.engines[BIND].connect()
+    return g._reportes_conn
+
+
+def _cerrar(_excepcion=None):
+    conn = g.pop('_reportes_conn', None)
+    if conn is not None:
+        conn.close()
+
+
+def ejecutar(sentencia, parametros=None):
+    """Ejecuta una consulta sobre la instantánea (nunca sobre la BD en vivo)."""
+    return _conexion().execute(sentencia, parametros or {})
+
+
+def generada():
+    """Hora (UTC, ISO) de la instantánea que está leyendo la petición actual."""
+    return ejecutar(text('SELECT generada_at FROM instantanea')).scalar()
+
+
+def tabla(nombre):
+    """
+    Tabla de la instantánea con los proyectos, votos o comentarios activos y los
+    archivados (UNION ALL), más la columna booleana `archivado`. Los ids de votos y
+    comentarios archivados pueden repetir ids activos: distinguirlos con `archivado`.
+    """
+    t = db.metadata.tables[nombre]
+    activos = select(t, false().label('archivado'))
+    copia = _PREFIJO_ARCHIVO + nombre
+    if not ejecutar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {'n': copia}).first():
+        return activos.subquery(nombre)
+    archivada = _metadata_archivo.tables.get(copia)
+    if archivada is None:
+        archivada = t.to_metadata(_metadata_archivo, name=copia)
+    return union_all(activos, select(archivada, true().label('archivado'))).subquery(nombre)
+
+
+def ruta(f):
+    """
+    Decorador de rutas de reportes: agrega X-Reporte-Generado a la respuesta.
+    503 (Retry-After) mientras la primera instantánea se genera en segundo plano.
+    """
+    @wraps(f)
+    def decorada(*args, **kwargs):
+        try:
+            asegurar(current_app.config)
+        except SinInstantanea:
+            return jsonify({'error': 'La instantánea de reportes se está generando.'}), 503, {'Retry-After': '30'}
+        respuesta = make_response(f(*args, **kwargs))
+        respuesta.headers['X-Reporte-Generado'] = generada()
+        return respuesta
+    return decorada
+
+
+# -----------------------------------------------------------------------------
+# Renovación periódica en segundo plano
+# -----------------------------------------------------------------------------
+
+class ActualizadorReportes:
+    """Hilo daemon: renueva la instantánea cuando tiene más de REPORTES_INTERVALO_MINUTOS."""
+
+    def __init__(self):
+        self.app = None
+        self._hilo = None
+        self._inicial = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('REPORTES_ACTIVO'):
+            self.iniciar()
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name='reportes')
+            self._hilo.start()
+
+    def generar(self):
+        """Genera la instantánea una vez en un hilo aparte (primer uso; no bloquea la petición)."""
+        with self._lock:
+            if self._inicial is not None and self._inicial.is_alive():
+                return
+            self._inicial = threading.Thread(target=self._renovar_con_registro, daemon=True, name='reportes-inicial')
+            self._inicial.start()
+
+    def _renovar(self):
+        """Genera la instantánea si este proceso obtiene el bloqueo (si no, otro la está generando)."""
+        config = self.app.config
+        os.makedirs(os.path.dirname(os.path.abspath(config['REPORTES_PATH'])), exist_ok=True)
+        bloqueo = _tomar_bloqueo(config)
+        if bloqueo:
+            try:
+                with self.app.app_context():
+                    resultado = actualizar(config)
+                self.app.logger.info('[reportes] Instantánea %s en %s s', resultado['generada'], resultado['segundos'])
+            finally:
+                os.remove(bloqueo)
+
+    def _renovar_con_registro(self):
+        try:
+            self._renovar()
+        except Exception:
+            self.app.logger.exception('[reportes] Error al generar la instantánea')
+
+    def _bucle(self):
+        config = self.app.config
+        intervalo = config['REPORTES_INTERVALO_MINUTOS'] * 60
+        ruta_bd = config['REPORTES_PATH']
+        while True:
+            if not os.path.exists(ruta_bd) or time.time() - os.path.getmtime(ruta_bd) >= intervalo:
+                self._renovar_con_registro()
+            # Revisar con más frecuencia que el intervalo (otro worker pudo renovarla)
+            time.sleep(min(intervalo, 60))
+
+
+actualizador = ActualizadorReportes()
@@ -0,0 +1,317 @@
+"""
+=============================================================================
+RESPALDOS EN LÍNEA DE LA BASE DE DATOS SQLITE
+=============================================================================
+
+Copiar instance/escuela.db con cp mientras la app escribe puede dejar un archivo
+corrupto, y detener el contenedor bloquea votos y comentarios. Aquí se usa la API
+de backup de SQLite (sqlite3.Connection.backup):
+
+- Se copian RESPALDO_PAGINAS_POR_PASO páginas por paso y se duerme
+  RESPALDO_PAUSA_SEGUNDOS entre pasos: el bloqueo de lectura solo dura un paso,
+  así que las escrituras de la app nunca esperan más que eso.
+- Si otra conexión escribe durante la copia, SQLite la reinicia. Tras
+  RESPALDO_MAX_REINICIOS reinicios se vuelve a intentar con pasos 4 veces más grandes
+  (converge aunque haya escrituras constantes).
+- Opcionalmente se comprime con gzip (.db.gz) y se rota: se conservan los
+  RESPALDO_RETENCION más recientes.
+- Si existe la BD de archivo (ARCHIVO_PATH, años cerrados movidos por `flask
+  archivar`) se respalda junto con la principal: archivo-<fecha>.db[.gz], con sus
+  filas en el mismo manifiesto; se rota y se verifica con ella.
+- verificar(): restaura en un archivo temporal, ejecuta PRAGMA integrity_check y
+  compara el número de filas por tabla con el manifiesto (.json) guardado al respaldar.
+
+Uso: `flask respaldar`, `flask respaldo-verificar [ARCHIVO]`, o el hilo programado
+con RESPALDO_ACTIVO=true (cada RESPALDO_INTERVALO_HORAS).
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from extensions import db
+
+_PREFIJO = 'escuela-'
+_PREFIJO_ARCHIVO = 'archivo-'
+_BLOQUEO = '.respaldo.lock'
+_BLOQUEO_VENCIDO_SEGUNDOS = 6 * 3600
+
+
+class _Reinicios(Exception):
+    """La copia se reinició demasiadas veces por escrituras concurrentes."""
+
+
+def ruta_bd():
+    """Archivo de la base de datos de la app (solo SQLite)."""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise RuntimeError('Los respaldos en línea solo aplican a una base SQLite en archivo.')
+    return url.database
+
+
+def contar_filas(conn):
+    """{tabla: filas} para cada tabla de los modelos presente en la conexión."""
+    existentes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {
+        t.name: conn.execute(f'SELECT COUNT(*) FROM "{t.name}"').fetchone()[0]
+        for t in db.metadata.sorted_tables
+        if t.name in existentes
+    }
+
+
+def _copiar(origen, destino, paginas, pausa, max_reinicios):
+    """Backup paso a paso; lanza _Reinicios si SQLite reinicia la copia demasiadas veces."""
+    estado = {'restantes': None, 'reinicios': 0}
+
+    def progreso(status, restantes, total):
+        if estado['restantes'] is not None and restantes > estado['restantes']:
+            estado['reinicios'] += 1
+            if estado['reinicios'] > max_reinicios:
+                raise _Reinicios()
+        estado['restantes'] = restantes
+        # Ceder entre pasos: aquí las escrituras de la app toman el bloqueo
+        time.sleep(pausa)
+
+    src = sqlite3.connect(origen)
+    dst = sqlite3.connect(destino)
+    try:
+        src.backup(dst, pages=paginas, progress=progreso)
+        return contar_filas(dst), estado['reinicios']
+    finally:
+        dst.close()
+        src.close()
+
+
+def copiar_en_linea(origen, destino, config):
+    """
+    Copia `origen` en `destino` con la API de backup, por pasos; si se reinicia
+    demasiadas veces, reintenta con pasos 4 veces más grandes. Retorna (filas, reinicios).
+    También la usa reportes.py para su instantánea.
+    """
+    paginas = config['RESPALDO_PAGINAS_POR_PASO']
+    reinicios = 0
+    while True:
+        try:
+            filas, r = _copiar(origen, destino, paginas, config['RESPALDO_PAUSA_SEGUNDOS'],
+                               config['RESPALDO_MAX_REINICIOS'])
+            return filas, reinicios + r
+        except _Reinicios:
+            reinicios += config['RESPALDO_MAX_REINICIOS'] + 1
+            paginas *= 4
+
+
+def _comprimir(ruta):
+    destino = ruta + '.gz'
+    with open(ruta, 'rb') as f_in, gzip.open(destino, 'wb', compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    os.remove(ruta)
+    return destino
+
+
+def listar(directorio):
+    """Respaldos existentes, del más antiguo al más reciente."""
+    return sorted(
+        glob.glob(os.path.join(directorio, _PREFIJO + '*.db')) +
+        glob.glob(os.path.join(directorio, _PREFIJO + '*.db.gz')),
+        key=lambda ruta: (os.path.getmtime(ruta), ruta),
+    )
+
+
+def _manifiesto(ruta):
+    return ruta[:-3] + '.json' if ruta.endswith('.gz') else ruta + '.json'
+
+
+def _del_archivo(ruta):
+    """Respaldo de ARCHIVO_PATH que acompaña al respaldo `ruta` (mismo sufijo de fecha)."""
+    directorio, nombre = os.path.split(ruta)
+    return os.path.join(directorio, _PREFIJO_ARCHIVO + nombre[len(_PREFIJO):])
+
+
+def rotar(directorio, conservar):
+    """Borra los respaldos (con su manifiesto y su respaldo del archivo) más antiguos que los `conservar` más recientes."""
+    borrados = []
+    for ruta in listar(directorio)[:-conservar] if conservar > 0 else []:
+        for archivo in (ruta, _manifiesto(ruta), _del_archivo(ruta)):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+        borrados.append(ruta)
+    return borrados
+
+
+def _copiar_a(origen, final, config, comprimir):
+    """Copia en línea a un temporal y lo renombra (nunca queda un respaldo a medias). Retorna (ruta, filas, reinicios)."""
+    tmp = final + '.tmp'
+    try:
+        filas, reinicios = copiar_en_linea(origen, tmp, config)
+        os.replace(tmp, final)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if comprimir:
+        final = _comprimir(final)
+    return final, filas, reinicios
+
+
+def respaldar(config, comprimir=None, directorio=None):
+    """
+    Crea un respaldo en línea de la BD y, si existe, de ARCHIVO_PATH.
+    Retorna {'archivo', 'filas', 'reinicios', 'segundos', 'rotados', 'archivo_anios'}
+    (archivo_anios: {'archivo', 'filas'} del respaldo del archivo, o None).
+    """
+    inicio = time.monotonic()
+    directorio = directorio or config['RESPALDO_DIR']
+    comprimir = config['RESPALDO_COMPRIMIR'] if comprimir is None else comprimir
+    os.makedirs(directorio, exist_ok=True)
+    origen = ruta_bd()
+    # Se devuelve la conexión al pool: la copia usa sus propias conexiones sqlite3
+    db.session.remove()
+
+    base = os.path.join(directorio, _PREFIJO + datetime.now().strftime('%Y%m%d-%H%M%S'))
+    final, n = base + '.db', 1
+    while glob.glob(glob.escape(final) + '*'):
+        final, n = f'{base}-{n}.db', n + 1
+    copia_archivo = _del_archivo(final)
+    final, filas, reinicios = _copiar_a(origen, final, config, comprimir)
+    manifiesto = {'origen': origen, 'creado': datetime.now().isoformat(timespec='seconds'), 'filas': filas}
+
+    archivo_anios = None
+    ruta_archivo = config.get('ARCHIVO_PATH')
+    if ruta_archivo and os.path.exists(ruta_archivo):
+        copia, filas_archivo, r = _copiar_a(ruta_archivo, copia_archivo, config, comprimir)
+        reinicios += r
+        archivo_anios = {'archivo': copia, 'filas': filas_archivo}
+        manifiesto['archivo'] = {'origen': ruta_archivo, 'copia': os.path.basename(copia), 'filas': filas_archivo}
+
+    with open(_manifiesto(final), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    rotados = rotar(directorio, config['RESPALDO_RETENCION'])
+    return {
+        'archivo': final,
+        'filas': filas,
+        'reinicios': reinicios,
+        'segundos': round(time.monotonic() - inicio, 2),
+        'rotados': rotados,
+        'archivo_anios': archivo_anios,
+    }
+
+
+def _restaurar(ruta):
+    """Restaura un respaldo en un temporal y retorna (integridad, filas)."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        restaurado = os.path.join(tmpdir, 'restaurado.db')
+        if ruta.endswith('.gz'):
+            with gzip.open(ruta, 'rb') as f_in, open(restaurado, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        else:
+            shutil.copyfile(ruta, restaurado)
+        conn = sqlite3.connect(restaurado)
+        try:
+            return conn.execute('PRAGMA integrity_check').fetchone()[0], contar_filas(conn)
+        finally:
+            conn.close()
+
+
+def _diferencias(esperadas, filas, prefijo=''):
+    return {
+        prefijo + t: (esperadas.get(t), filas.get(t))
+        for t in set(esperadas) | set(filas)
+        if esperadas and esperadas.get(t) != filas.get(t)
+    }
+
+
+def verificar(ruta):
+    """
+    Restaura el respaldo (y el del archivo, si el manifiesto lo incluye) en un temporal y lo comprueba.
+    Retorna (ok, integridad, diferencias) donde diferencias = {tabla: (esperadas, encontradas)};
+    las tablas del archivo van como 'archivo.<tabla>'.
+    """
+    integridad, filas = _restaurar(ruta)
+    ok = integridad == 'ok'
+
+    manifiesto = {}
+    if os.path.exists(_manifiesto(ruta)):
+        with open(_manifiesto(ruta), encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    diferencias = _diferencias(manifiesto.get('filas', {}), filas)
+
+    if 'archivo' in manifiesto:
+        copia = os.path.join(os.path.dirname(ruta), manifiesto['archivo']['copia'])
+        if not os.path.exists(copia):
+            diferencias['archivo'] = (manifiesto['archivo']['copia'], None)
+        else:
+            integridad_archivo, filas_archivo = _restaurar(copia)
+            if integridad_archivo != 'ok':
+                ok = False
+                integridad = f'{integridad}; archivo: {integridad_archivo}'
+            diferencias.update(_diferencias(manifiesto['archivo']['filas'], filas_archivo, 'archivo.'))
+    return ok and not diferencias, integridad, diferencias
+
+
+# -----------------------------------------------------------------------------
+# Respaldo programado en segundo plano
+# -----------------------------------------------------------------------------
+
+class RespaldoProgramado:
+    """
+    Hilo daemon: respalda cada RESPALDO_INTERVALO_HORAS. Con varios workers solo uno
+    respalda (archivo de bloqueo) y se omite si ya hay un respaldo reciente.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._hilo = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('RESPALDO_ACTIVO'):
+            self.iniciar()
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name='respaldo')
+            self._hilo.start()
+
+    def _toca_respaldar(self, directorio, intervalo):
+        existentes = listar(directorio)
+        return not existentes or time.time() - os.path.getmtime(existentes[-1]) >= intervalo
+
+    def _tomar_bloqueo(self, directorio):
+        ruta = os.path.join(directorio, _BLOQUEO)
+        if os.path.exists(ruta) and time.time() - os.path.getmtime(ruta) > _BLOQUEO_VENCIDO_SEGUNDOS:
+            os.remove(ruta)
+        try:
+            os.close(os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return ruta
+        except FileExistsError:
+            return None
+
+    def _bucle(self):
+        config = self.app.config
+        intervalo = config['RESPALDO_INTERVALO_HORAS'] * 3600
+        directorio = config['RESPALDO_DIR']
+        while True:
+            try:
+                os.makedirs(directorio, exist_ok=True)
+                if self._toca_respaldar(directorio, intervalo):
+                    bloqueo = self._tomar_bloqueo(directorio)
+                    if bloqueo:
+                        try:
+                            with self.app.app_context():
+                                resultado = respaldar(config)
+                            self.app.logger.info('[respaldo] %s en %s s', resultado['archivo'], resultado['segundos'])
+                        finally:
+                            os.remove(bloqueo)
+            except Exception:
+                self.app.logger.exception('[respaldo] Error al respaldar la BD')
+            # Revisar con más frecuencia que el intervalo (otro worker pudo respaldar)
+            time.sleep(min(intervalo, 600))
+
+
+programado = RespaldoProgramado()
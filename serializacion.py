@@ -0,0 +1,140 @@
+"""
+=============================================================================
+SERIALIZACIÓN COMPACTA DE LA API (Presupuesto y Comentario)
+=============================================================================
+
+- FilaPresupuesto / FilaComentario: filas ligeras con __slots__ armadas directo
+  desde las tuplas de un SELECT proyectado. No se crean instancias ORM ni pasan
+  por el identity map.
+- Cada campo de salida declara las columnas que necesita: con
+  ?campos=id,concepto,likes solo se consultan esas columnas y solo se arman esas
+  claves. Los campos que dependen de la petición (EXTRAS_PRESUPUESTO: mi_voto,
+  comentarios, es_admin) los agrega la ruta, y solo si se piden.
+- responder(): JSON compacto con un codificador reutilizable (sin espacios ni
+  indentación aunque la app esté en debug, sin ordenar claves y con los acentos
+  en UTF-8 en vez de escapes \\uXXXX).
+"""
+
+import json
+
+from flask import current_app
+from sqlalchemy import select
+
+import categorias
+from extensions import db
+from models import Comentario, Presupuesto
+
+_codificador = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+
+
+class _Fila:
+    """Fila proyectada: solo se asignan las columnas consultadas."""
+    __slots__ = ()
+
+    def __init__(self, nombres, valores):
+        for nombre, valor in zip(nombres, valores):
+            setattr(self, nombre, valor)
+
+
+class FilaPresupuesto(_Fila):
+    __slots__ = (
+        'id', 'concepto', 'descripcion', 'descripcion_corta', 'resumen_card', 'imagen_url',
+        'fecha', 'categoria_id', 'monto', 'cantidad_gasto', 'likes', 'dislikes',
+    )
+
+
+class FilaComentario(_Fila):
+    __slots__ = ('id', 'presupuesto_id', 'autor', 'contenido', 'fecha_creacion')
+
+
+def _iso(valor):
+    return valor.isoformat() if valor else ''
+
+
+# Campo de salida -> (columnas que necesita, valor a partir de la fila).
+# Mismo formato que tenía /api/presupuesto/<id>.
+CAMPOS_PRESUPUESTO = {
+    'id': (('id',), lambda f: f.id),
+    'concepto': (('concepto',), lambda f: f.concepto),
+    'descripcion': (('descripcion',), lambda f: f.descripcion or ''),
+    'descripcion_corta': (
+        ('descripcion_corta', 'resumen_card'),
+        lambda f: f.descripcion_corta or Presupuesto.truncar(f.resumen_card, 80) or '',
+    ),
+    'imagen_url': (('imagen_url',), lambda f: f.imagen_url or ''),
+    'fecha': (('fecha',), lambda f: _iso(f.fecha)),
+    'categoria': (('categoria_id',), lambda f: categorias.nombre(f.categoria_id)),
+    'monto': (('monto',), lambda f: f.monto),
+    'cantidad_gasto': (('cantidad_gasto',), lambda f: f.cantidad_gasto or 0),
+    'likes': (('likes',), lambda f: f.likes or 0),
+    'dislikes': (('dislikes',), lambda f: f.dislikes or 0),
+}
+EXTRAS_PRESUPUESTO = ('mi_voto', 'comentarios', 'es_admin')
+TODOS_PRESUPUESTO = tuple(CAMPOS_PRESUPUESTO) + EXTRAS_PRESUPUESTO
+
+CAMPOS_COMENTARIO = {
+    'id': (('id',), lambda f: f.id),
+    'autor': (('autor',), lambda f: f.autor or 'Anónimo'),
+    'contenido': (('contenido',), lambda f: f.contenido),
+    'fecha': (('fecha_creacion',), lambda f: _iso(f.fecha_creacion)),
+}
+
+
+def campos_pedidos(valor, disponibles=TODOS_PRESUPUESTO):
+    """
+    Campos de ?campos=a,b,c en el orden de `disponibles` (todos si valor no nombra
+    ninguno: '', ',' o '%20'). Lanza ValueError con los nombres desconocidos.
+    """
+    pedidos = {c.strip() for c in (valor or '').split(',') if c.strip()}
+    if not pedidos:
+        return tuple(disponibles)
+    desconocidos = pedidos - set(disponibles)
+    if desconocidos:
+        raise ValueError(', '.join(sorted(desconocidos)))
+    return tuple(c for c in disponibles if c in pedidos)
+
+
+def _columnas(definiciones, campos, obligatorias):
+    """Nombres de columna (sin repetir) que necesitan los campos pedidos."""
+    nombres = list(obligatorias)
+    for campo in campos:
+        if campo in definiciones:
+            nombres.extend(definiciones[campo][0])
+    return list(dict.fromkeys(nombres))
+
+
+def _a_dict(definiciones, fila, campos):
+    return {campo: definiciones[campo][1](fila) for campo in campos if campo in definiciones}
+
+
+def presupuestos(ids, campos):
+    """{id: FilaPresupuesto} de los ids existentes, con solo las columnas que piden `campos`."""
+    nombres = _columnas(CAMPOS_PRESUPUESTO, campos, ('id',))
+    resultado = db.session.execute(
+        select(*[getattr(Presupuesto, n) for n in nombres]).where(Presupuesto.id.in_(ids))
+    )
+    return {t[0]: FilaPresupuesto(nombres, t) for t in resultado}
+
+
+def presupuesto_dict(fila, campos):
+    """Claves de columnas de `campos` (los EXTRAS_PRESUPUESTO los agrega la ruta)."""
+    return _a_dict(CAMPOS_PRESUPUESTO, fila, campos)
+
+
+def comentarios(presupuesto_ids, campos=tuple(CAMPOS_COMENTARIO)):
+    """{presupuesto_id: [dict]} en orden de creación (una consulta con IN)."""
+    nombres = _columnas(CAMPOS_COMENTARIO, campos, ('presupuesto_id',))
+    resultado = {pid: [] for pid in presupuesto_ids}
+    for t in db.session.execute(
+        select(*[getattr(Comentario, n) for n in nombres])
+        .where(Comentario.presupuesto_id.in_(presupuesto_ids))
+        .order_by(Comentario.fecha_creacion)
+    ):
+        fila = FilaComentario(nombres, t)
+        resultado[fila.presupuesto_id].append(_a_dict(CAMPOS_COMENTARIO, fila, campos))
+    return resultado
+
+
+def responder(datos, status=200):
+    """Response JSON compacta."""
+    return current_app.response_class(_codificador.encode(datos), status=status, mimetype='application/json')
@@ -19,6 +19,9 @@
 
     let currentCenterIndex = 0;
     const totalCards = cards.length;
+    let streamActual = null; // EventSource del proyecto abierto en el modal
+    const detalleCache = {}; // id -> { datos, t } (precargados por lote; t = hora de la respuesta)
+    const DETALLE_TTL_MS = 30000; // Pasado este tiempo el detalle se vuelve a pedir al abrir el modal
 
     /* -------------------------------------------------------------------------
      * CARRUSEL: centrar la tarjeta en el índice dado y aplicar resalte al centro
@@ -69,6 +72,19 @@
         return div.innerHTML;
     }
 
+    // Token CSRF desde la meta; las páginas del publicador estático la traen vacía y se pide a /api/csrf
+    function obtenerCsrf() {
+        var meta = document.querySelector('meta[name="csrf-token"]');
+        var token = meta ? meta.getAttribute('content') : '';
+        if (token) return Promise.resolve(token);
+        return fetch('/api/csrf')
+            .then(function (r) { return r.json(); })
+            .then(function (d) {
+                if (meta) meta.setAttribute('content', d.csrf_token);
+                return d.csrf_token;
+            });
+    }
+
     function renderModalContent(data) {
         const imgUrl = data.imagen_url ? (data.imagen_url.indexOf('http') === 0 ? data.imagen_url : '/static/' + data.imagen_url) : '';
         const imgHtml = imgUrl
@@ -113,6 +129,69 @@
         );
     }
 
+    /* -------------------------------------------------------------------------
+     * PRECARGA: una sola petición a /api/presupuestos/lote trae los datos de todas
+     * las cards visibles; el modal se abre desde la caché sin esperar a la red.
+     * Una entrada con más de DETALLE_TTL_MS se vuelve a pedir (votos y comentarios
+     * de otros usuarios); con el modal abierto la mantiene al día el SSE.
+     * ------------------------------------------------------------------------- */
+    function guardarDetalle(datos) {
+        detalleCache[datos.id] = { datos: datos, t: Date.now() };
+    }
+
+    function precargarDetalles(ids) {
+        if (!ids.length) return;
+        fetch('/api/presupuestos/lote?ids=' + ids.slice(0, 50).join(','))
+            .then(function (res) { return res.ok ? res.json() : null; })
+            .then(function (d) {
+                if (!d) return;
+                (d.presupuestos || []).forEach(guardarDetalle);
+            })
+            .catch(function () {});
+    }
+
+    function obtenerDetalle(id) {
+        const entrada = detalleCache[id];
+        if (entrada && Date.now() - entrada.t < DETALLE_TTL_MS) return Promise.resolve(entrada.datos);
+        return fetch('/api/presupuesto/' + id)
+            .then(function (res) {
+                if (!res.ok) throw new Error(res.status);
+                return res.json();
+            })
+            .then(function (data) {
+                guardarDetalle(data);
+                return data;
+            });
+    }
+
+    if (cards.length) {
+        precargarDetalles(Array.prototype.map.call(cards, function (card) { return card.getAttribute('data-id'); }));
+    }
+
+    /* -------------------------------------------------------------------------
+     * TIEMPO REAL (SSE): mientras el modal está abierto, /api/stream envía los
+     * contadores de votos y los comentarios nuevos/eliminados del proyecto.
+     * ------------------------------------------------------------------------- */
+    function cerrarStream() {
+        if (streamActual) {
+            streamActual.close();
+            streamActual = null;
+        }
+    }
+
+    function htmlComentario(c) {
+        return '<strong>' + escapeHtml(c.autor) + '</strong> <span class="modal-comentario__fecha">' + escapeHtml(c.fecha ? new Date(c.fecha).toLocaleDateString('es-MX') : '') + '</span><p>' + escapeHtml(c.contenido) + '</p>';
+    }
+
+    function abrirStream(id, onVoto, onComentario, onComentarioEliminado) {
+        cerrarStream();
+        if (!window.EventSource) return;
+        streamActual = new EventSource('/api/stream?ids=' + encodeURIComponent(id));
+        streamActual.addEventListener('voto', function (e) { onVoto(JSON.parse(e.data)); });
+        streamActual.addEventListener('comentario', function (e) { onComentario(JSON.parse(e.data)); });
+        streamActual.addEventListener('comentario_eliminado', function (e) { onComentarioEliminado(JSON.parse(e.data)); });
+    }
+
     if (modalEl && modalPlaceholder) {
         // Bloquear scroll del fondo cuando el modal está abierto
         modalEl.addEventListener('show.bs.modal', function () {
@@ -120,6 +199,7 @@
         });
         modalEl.addEventListener('hidden.bs.modal', function () {
             document.body.classList.remove('modal-open-scroll-lock');
+            cerrarStream();
         });
 
         modalEl.addEventListener('show.bs.modal', function (event) {
@@ -136,13 +216,14 @@
             }
             modalPlaceholder.innerHTML = '<p class="text-muted">Cargando...</p>';
 
-            fetch('/api/presupuesto/' + id)
-                .then(function (res) { return res.json(); })
+            obtenerDetalle(id)
                 .then(function (data) {
                     modalPlaceholder.innerHTML = renderModalContent(data);
 
-                    var csrfToken = (document.querySelector('meta[name="csrf-token"]') && document.querySelector('meta[name="csrf-token"]').getAttribute('content')) || '';
+                    // Los cambios también se aplican a la caché para que al reabrir el modal esté al día
                     function updateCounts(d) {
+                        data.likes = d.likes;
+                        data.dislikes = d.dislikes;
                         var likeSpan = modalPlaceholder.querySelector('.btn-reaccion--like .btn-reaccion__count');
                         var dislikeSpan = modalPlaceholder.querySelector('.btn-reaccion--dislike .btn-reaccion__count');
                         if (likeSpan) likeSpan.textContent = d.likes;
@@ -152,7 +233,10 @@
                     modalPlaceholder.querySelectorAll('.btn-reaccion--like').forEach(function (btn) {
                         btn.addEventListener('click', function () {
                             const pid = this.getAttribute('data-id');
-                            fetch('/api/presupuesto/' + pid + '/like', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } })
+                            obtenerCsrf()
+                                .then(function (csrfToken) {
+                                    return fetch('/api/presupuesto/' + pid + '/like', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } });
+                                })
                                 .then(function (r) {
                                     if (r.status === 401) { alert('Inicia sesión para votar.'); return null; }
                                     return r.json();
@@ -164,7 +248,10 @@
                     modalPlaceholder.querySelectorAll('.btn-reaccion--dislike').forEach(function (btn) {
                         btn.addEventListener('click', function () {
                             const pid = this.getAttribute('data-id');
-                            fetch('/api/presupuesto/' + pid + '/dislike', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } })
+                            obtenerCsrf()
+                                .then(function (csrfToken) {
+                                    return fetch('/api/presupuesto/' + pid + '/dislike', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } });
+                                })
                                 .then(function (r) {
                                     if (r.status === 401) { alert('Inicia sesión para votar.'); return null; }
                                     return r.json();
@@ -177,9 +264,13 @@
                         btn.addEventListener('click', function () {
                             var cid = this.getAttribute('data-comentario-id');
                             if (!cid || !confirm('¿Eliminar este comentario?')) return;
-                            fetch('/api/comentario/' + cid + '/eliminar', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } })
+                            obtenerCsrf()
+                                .then(function (csrfToken) {
+                                    return fetch('/api/comentario/' + cid + '/eliminar', { method: 'POST', headers: { 'X-CSRFToken': csrfToken } });
+                                })
                                 .then(function (r) { return r.json(); })
                                 .then(function () {
+                                    data.comentarios = (data.comentarios || []).filter(function (c) { return String(c.id) !== String(cid); });
                                     var div = modalPlaceholder.querySelector('.modal-comentario[data-comentario-id="' + cid + '"]');
                                     if (div) div.remove();
                                 });
@@ -195,28 +286,45 @@
                             var formData = new FormData();
                             formData.append('autor', autor);
                             formData.append('contenido', contenido);
-                            var csrfMeta = document.querySelector('meta[name="csrf-token"]');
-                            formData.append('csrf_token', csrfMeta ? csrfMeta.getAttribute('content') : '');
-                            fetch('/api/presupuesto/' + pid + '/comentarios', {
-                                method: 'POST',
-                                body: formData,
-                                headers: { 'X-Requested-With': 'XMLHttpRequest' }
-                            })
+                            obtenerCsrf()
+                                .then(function (csrfToken) {
+                                    formData.append('csrf_token', csrfToken);
+                                    return fetch('/api/presupuesto/' + pid + '/comentarios', {
+                                        method: 'POST',
+                                        body: formData,
+                                        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+                                    });
+                                })
                                 .then(function (r) { return r.json(); })
                                 .then(function (c) {
-                                    var list = modalPlaceholder.querySelector('.modal-comentarios__list');
-                                    if (list) {
-                                        var div = document.createElement('div');
-                                        div.className = 'modal-comentario';
-                                        div.setAttribute('data-comentario-id', c.id);
-                                        div.innerHTML = '<strong>' + escapeHtml(c.autor) + '</strong> <span class="modal-comentario__fecha">' + escapeHtml(c.fecha ? new Date(c.fecha).toLocaleDateString('es-MX') : '') + '</span><p>' + escapeHtml(c.contenido) + '</p>';
-                                        list.appendChild(div);
-                                    }
+                                    agregarComentario(c);
                                     var ta = modalPlaceholder.querySelector('.modal-comentarios__texto');
                                     if (ta) ta.value = '';
                                 });
                         });
                     });
+
+                    // Añade un comentario a la lista (sin duplicar si ya llegó por SSE)
+                    function agregarComentario(c) {
+                        var list = modalPlaceholder.querySelector('.modal-comentarios__list');
+                        if (!list || list.querySelector('.modal-comentario[data-comentario-id="' + c.id + '"]')) return;
+                        data.comentarios = (data.comentarios || []).concat([c]);
+                        var div = document.createElement('div');
+                        div.className = 'modal-comentario';
+                        div.setAttribute('data-comentario-id', c.id);
+                        div.innerHTML = htmlComentario(c);
+                        list.appendChild(div);
+                    }
+
+                    abrirStream(data.id, updateCounts, agregarComentario, function (d) {
+                        // Un id, o varios (moderación en lote)
+                        var ids = (d.ids || [d.id]).map(String);
+                        data.comentarios = (data.comentarios || []).filter(function (c) { return ids.indexOf(String(c.id)) === -1; });
+                        ids.forEach(function (cid) {
+                            var div = modalPlaceholder.querySelector('.modal-comentario[data-comentario-id="' + cid + '"]');
+                            if (div) div.remove();
+                        });
+                    });
                 })
                 .catch(function () {
                     modalPlaceholder.innerHTML = '<p class="text-muted">Error al cargar el detalle.</p>';
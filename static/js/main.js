@@ -9,8 +9,15 @@
  * 2. Carrusel de imágenes (Franja 1 - Presentación)
  * 3. Carrusel de cards con flechas de navegación
  * 4. Modal Bootstrap (preparado, se dispara al hacer click en una card)
+ * 5. Registro del service worker (/sw.js): navegación cache-first y offline
  */
 
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function () {
+        navigator.serviceWorker.register('/sw.js').catch(function () {});
+    });
+}
+
 document.addEventListener('DOMContentLoaded', function () {
 
     /* =========================================================================
@@ -141,6 +148,26 @@ document.addEventListener('DOMContentLoaded', function () {
     });
 
 
+    /* =========================================================================
+       FILTROS DEL LISTADO - Enviar solo la query canónica
+       =========================================================================
+       Los filtros vacíos y el orden por defecto no se envían: la URL queda igual
+       a la publicada como estática y se evita la redirección a la canónica.
+       ========================================================================= */
+    const filtrosForm = document.querySelector('.filtros-form');
+    if (filtrosForm) {
+        filtrosForm.addEventListener('submit', function () {
+            filtrosForm.querySelectorAll('select').forEach(function (sel) {
+                if (!sel.value || (sel.name === 'orden' && sel.value === 'likes')) sel.disabled = true;
+            });
+        });
+        // Al volver con "Atrás" (bfcache) los selects seguirían deshabilitados
+        window.addEventListener('pageshow', function () {
+            filtrosForm.querySelectorAll('select').forEach(function (sel) { sel.disabled = false; });
+        });
+    }
+
+
     /* =========================================================================
        CHATBOT ROBOTSITO - Bienvenida → ícono flotante → ventana chat con FAQ
        ========================================================================= */
@@ -0,0 +1,174 @@
+/**
+ * =============================================================================
+ * SERVICE WORKER - Navegación cache-first y offline
+ * - Precarga el "shell" estático (CSS/JS propios) y lo sirve stale-while-revalidate:
+ *   al instante desde caché, y en segundo plano pide la versión actual (petición
+ *   condicional, 304 si no cambió) para la siguiente carga. Un despliegue nuevo se
+ *   ve a más tardar en la segunda visita, sin tener que cambiar CACHE_SHELL.
+ * - Stale-while-revalidate para /api/presupuesto/<id>, /presupuestos, /presupuesto/<id> e inicio:
+ *   responde desde caché al instante y revalida en segundo plano solo si la copia
+ *   tiene más de REVALIDAR_MS (menos peticiones al servidor).
+ * - Caché de datos acotada (MAX_ENTRADAS) con expulsión LRU.
+ * - /api/catalogo/version (consultada como mucho cada VERSION_MS): si cambia, se
+ *   vacía la caché de datos. También se vacía al pasar por /auth/ (login/logout).
+ * Se sirve desde /sw.js (ruta en app.py) para que su alcance sea todo el sitio.
+ * =============================================================================
+ */
+
+'use strict';
+
+const CACHE_SHELL = 'cucea-shell-v3';
+const CACHE_DATOS = 'cucea-datos-v1';
+const SHELL = [
+    '/static/css/main.css',
+    '/static/js/main.js',
+    '/static/js/index-carousel-modal.js',
+];
+const MAX_ENTRADAS = 60;
+const REVALIDAR_MS = 30 * 1000;
+const VERSION_MS = 60 * 1000;
+const HEADER_FECHA = 'X-SW-Fecha';
+const CSRF_META = /(<meta name="csrf-token" content=")[^"]*(")/;
+
+let versionCatalogo = null;
+let ultimaConsultaVersion = 0;
+
+self.addEventListener('install', function (event) {
+    event.waitUntil(
+        caches.open(CACHE_SHELL)
+            .then(function (cache) { return cache.addAll(SHELL); })
+            .then(function () { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys()
+            .then(function (nombres) {
+                return Promise.all(nombres.filter(function (n) {
+                    return n !== CACHE_SHELL && n !== CACHE_DATOS;
+                }).map(function (n) { return caches.delete(n); }));
+            })
+            .then(function () { return self.clients.claim(); })
+    );
+});
+
+function esCacheable(url) {
+    return url.pathname === '/' ||
+        url.pathname === '/presupuestos' ||
+        /^\/presupuesto\/\d+$/.test(url.pathname) ||
+        /^\/api\/presupuesto\/\d+$/.test(url.pathname);
+}
+
+/* Copia de la respuesta con la hora de guardado (para decidir si revalidar).
+   En HTML se vacía la meta csrf-token (caduca); el JS la pide a /api/csrf. */
+function conFecha(respuesta) {
+    const esHtml = (respuesta.headers.get('Content-Type') || '').indexOf('text/html') === 0;
+    return respuesta.text().then(function (cuerpo) {
+        if (esHtml) cuerpo = cuerpo.replace(CSRF_META, '$1$2');
+        const headers = new Headers(respuesta.headers);
+        headers.set(HEADER_FECHA, String(Date.now()));
+        headers.delete('Content-Length');
+        return new Response(cuerpo, { status: respuesta.status, statusText: respuesta.statusText, headers: headers });
+    });
+}
+
+/* LRU: Cache.put mueve la entrada al final; se expulsan las primeras */
+function recortar(cache) {
+    return cache.keys().then(function (claves) {
+        const sobrantes = claves.length - MAX_ENTRADAS;
+        if (sobrantes <= 0) return;
+        return Promise.all(claves.slice(0, sobrantes).map(function (k) { return cache.delete(k); }));
+    });
+}
+
+function guardar(request, respuesta) {
+    // Respuestas de usuarios con sesión (Cache-Control: no-store) no se guardan
+    const cc = respuesta.headers.get('Cache-Control') || '';
+    if (!respuesta.ok || cc.indexOf('no-store') !== -1) return Promise.resolve();
+    return Promise.all([caches.open(CACHE_DATOS), conFecha(respuesta)])
+        .then(function (r) {
+            return r[0].put(request, r[1]).then(function () { return recortar(r[0]); });
+        });
+}
+
+function revisarVersion() {
+    const ahora = Date.now();
+    if (ahora - ultimaConsultaVersion < VERSION_MS) return Promise.resolve();
+    ultimaConsultaVersion = ahora;
+    return fetch('/api/catalogo/version', { cache: 'no-store' })
+        .then(function (r) { return r.json(); })
+        .then(function (d) {
+            if (versionCatalogo !== null && d.version !== versionCatalogo) {
+                return caches.delete(CACHE_DATOS).then(function () { versionCatalogo = d.version; });
+            }
+            versionCatalogo = d.version;
+        })
+        .catch(function () {});
+}
+
+function shellRevalidado(event) {
+    const request = event.request;
+    return caches.open(CACHE_SHELL).then(function (cache) {
+        return cache.match(request).then(function (enCache) {
+            const red = fetch(request).then(function (respuesta) {
+                if (!respuesta.ok) return respuesta;
+                return cache.put(request, respuesta.clone()).then(function () { return respuesta; });
+            });
+            if (!enCache) return red;
+            event.waitUntil(red.catch(function () {}));
+            return enCache;
+        });
+    });
+}
+
+function staleWhileRevalidate(event) {
+    const request = event.request;
+    return revisarVersion().then(function () {
+        return caches.open(CACHE_DATOS).then(function (cache) {
+            return cache.match(request).then(function (enCache) {
+                // La petición a la red solo se crea si hace falta: sin copia o con copia vieja
+                function red() {
+                    return fetch(request).then(function (respuesta) {
+                        return guardar(request, respuesta.clone()).then(function () { return respuesta; });
+                    });
+                }
+                if (!enCache) {
+                    return red().catch(function () {
+                        // Sin red ni copia: para navegaciones, mostrar el inicio cacheado
+                        return request.mode === 'navigate' ? cache.match('/') : Response.error();
+                    });
+                }
+                const fecha = Number(enCache.headers.get(HEADER_FECHA) || 0);
+                if (Date.now() - fecha > REVALIDAR_MS) {
+                    event.waitUntil(red().catch(function () {}));
+                } else {
+                    // Copia reciente: solo refrescar su posición LRU
+                    event.waitUntil(cache.put(request, enCache.clone()));
+                }
+                return enCache;
+            });
+        });
+    });
+}
+
+self.addEventListener('fetch', function (event) {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    // Login, logout o registro: la vista cambia (botones de admin, voto propio)
+    if (url.pathname.indexOf('/auth/') === 0) {
+        event.waitUntil(caches.delete(CACHE_DATOS));
+        return;
+    }
+    if (request.method !== 'GET') return;
+
+    if (SHELL.indexOf(url.pathname) !== -1) {
+        event.respondWith(shellRevalidado(event));
+        return;
+    }
+    if (esCacheable(url)) {
+        event.respondWith(staleWhileRevalidate(event));
+    }
+});
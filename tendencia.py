@@ -0,0 +1,226 @@
+"""
+=============================================================================
+RANKING DE TENDENCIA (hot_score)
+Puntuación por proyecto que combina likes, dislikes, comentarios y recencia.
+=============================================================================
+
+La columna Presupuesto.hot_score se mantiene de forma incremental:
+- Cada voto o comentario suma su peso con un UPDATE atómico de la fila. Al quitar
+  uno se resta lo que aún aporta: su peso decaído desde su fecha hasta el último
+  decaimiento (hot_score ya no contiene el peso completo).
+- Un proyecto nuevo arranca con un peso inicial para que aparezca en el carrusel.
+- Periódicamente (cron / CLI `flask tendencia-decaer`) toda la tabla se multiplica
+  por un factor de decaimiento en UNA sola sentencia UPDATE, de modo que la
+  actividad antigua pierde peso (vida media configurable). El factor sale de las
+  horas reales desde el último decaimiento (estado_catalogo.tendencia_decaida_at),
+  así un cron retrasado, adelantado o duplicado no cambia el resultado.
+
+Así el orden ?orden=tendencia se sirve desde el índice ix_presupuestos_hot_score
+sin recalcular nada al leer.
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, update
+
+from extensions import db
+from models import Presupuesto, VotoPresupuesto, Comentario, EstadoCatalogo
+
+
+def _cfg(clave, defecto):
+    """Lee un parámetro del ranking desde la configuración de la app."""
+    return current_app.config.get(clave, defecto)
+
+
+def peso_voto(tipo):
+    """Peso de un voto según su tipo ('like' o 'dislike'); 0 si no hay voto."""
+    if tipo == 'like':
+        return _cfg('TENDENCIA_PESO_LIKE', 1.0)
+    if tipo == 'dislike':
+        return _cfg('TENDENCIA_PESO_DISLIKE', -0.5)
+    return 0.0
+
+
+def peso_inicial():
+    """Puntuación con la que arranca un proyecto recién creado."""
+    return _cfg('TENDENCIA_PESO_NUEVO', 3.0)
+
+
+def _sumar(presupuesto, delta):
+    """Suma delta a hot_score con una expresión SQL (sin condiciones de carrera entre workers)."""
+    if delta:
+        presupuesto.hot_score = Presupuesto.hot_score + delta
+
+
+def _peso_acumulado(peso, fecha, decaida_at):
+    """
+    Parte de hot_score que aporta hoy un evento de peso `peso` registrado en `fecha`:
+    los decaimientos posteriores a la fecha ya lo redujeron (hot_score está decaído
+    hasta `decaida_at`). Un evento posterior al último decaimiento conserva su peso.
+    """
+    if fecha is None or decaida_at is None or fecha >= decaida_at:
+        return peso
+    return peso * factor_decaimiento((decaida_at - fecha).total_seconds() / 3600.0)
+
+
+def _decaida_at():
+    """Fecha del último decaimiento aplicado a hot_score (None si nunca se decayó)."""
+    return db.session.query(EstadoCatalogo.tendencia_decaida_at).filter(EstadoCatalogo.id == 1).scalar()
+
+
+def _restar(deltas):
+    """Resta {presupuesto_id: delta} a hot_score en una sola sentencia UPDATE."""
+    deltas = {pid: d for pid, d in deltas.items() if d}
+    if not deltas:
+        return
+    db.session.execute(
+        update(Presupuesto)
+        .where(Presupuesto.id.in_(deltas))
+        .values(hot_score=Presupuesto.hot_score - case(deltas, value=Presupuesto.id, else_=0.0))
+    )
+
+
+def registrar_voto(presupuesto, tipo_anterior, tipo_nuevo, fecha_anterior=None):
+    """
+    Ajusta hot_score tras un voto. Si el usuario cambia de like a dislike se
+    descuenta lo que aún aporta el voto anterior (emitido en fecha_anterior y ya
+    decaído) y se suma el peso completo del nuevo.
+    """
+    if tipo_anterior == tipo_nuevo:
+        return
+    anterior = peso_voto(tipo_anterior)
+    if anterior:
+        anterior = _peso_acumulado(anterior, fecha_anterior, _decaida_at())
+    _sumar(presupuesto, peso_voto(tipo_nuevo) - anterior)
+
+
+def registrar_comentario(presupuesto_id, signo=1, fecha=None):
+    """
+    Suma (signo=1) o resta (signo=-1) el peso de un comentario al proyecto.
+    Al restar, fecha es la de creación del comentario: se descuenta su peso ya decaído.
+    """
+    peso = _cfg('TENDENCIA_PESO_COMENTARIO', 0.5)
+    if signo < 0:
+        peso = _peso_acumulado(peso, fecha, _decaida_at())
+    db.session.execute(
+        update(Presupuesto)
+        .where(Presupuesto.id == presupuesto_id)
+        .values(hot_score=Presupuesto.hot_score + signo * peso)
+    )
+
+
+def quitar_comentarios(comentarios):
+    """
+    Moderación en lote: resta a cada proyecto el peso (ya decaído) de sus comentarios
+    borrados, [(presupuesto_id, fecha_creacion)], en una sola sentencia UPDATE.
+    """
+    if not comentarios:
+        return
+    peso, decaida_at = _cfg('TENDENCIA_PESO_COMENTARIO', 0.5), _decaida_at()
+    deltas = {}
+    for presupuesto_id, fecha in comentarios:
+        deltas[presupuesto_id] = deltas.get(presupuesto_id, 0.0) + _peso_acumulado(peso, fecha, decaida_at)
+    _restar(deltas)
+
+
+def quitar_votos(votos):
+    """
+    Votos borrados en lote (p. ej. al eliminar un usuario): resta a cada proyecto
+    el peso (ya decaído) de sus votos, [(presupuesto_id, tipo, fecha)], en una sola
+    sentencia UPDATE.
+    """
+    if not votos:
+        return
+    decaida_at = _decaida_at()
+    deltas = {}
+    for presupuesto_id, tipo, fecha in votos:
+        deltas[presupuesto_id] = deltas.get(presupuesto_id, 0.0) + _peso_acumulado(peso_voto(tipo), fecha, decaida_at)
+    _restar(deltas)
+
+
+def factor_decaimiento(horas):
+    """Factor multiplicativo para 'horas' transcurridas según la vida media configurada."""
+    vida_media = float(_cfg('TENDENCIA_VIDA_MEDIA_HORAS', 72))
+    return 0.5 ** (float(horas) / vida_media)
+
+
+def _marcar_decaimiento(anterior, ahora):
+    """
+    Registra `ahora` como último decaimiento solo si sigue siendo `anterior`
+    (comparar y cambiar: dos ejecuciones simultáneas no decaen dos veces).
+    Retorna False si otra ejecución se adelantó.
+    """
+    e = EstadoCatalogo
+    actualizadas = db.session.execute(
+        update(e)
+        .where(e.id == 1, e.tendencia_decaida_at.is_(None) if anterior is None else e.tendencia_decaida_at == anterior)
+        # fecha_actualizacion es la del catálogo: no la mueve el decaimiento
+        .values(tendencia_decaida_at=ahora, fecha_actualizacion=e.fecha_actualizacion)
+    ).rowcount
+    if actualizadas:
+        return True
+    if db.session.get(e, 1) is None:
+        db.session.add(e(id=1, version=0, tendencia_decaida_at=ahora))
+        return True
+    return False
+
+
+def decaer(horas=None, ahora=None):
+    """
+    Re-decae todas las puntuaciones en una sola sentencia UPDATE.
+    horas: tiempo transcurrido a aplicar; por defecto, las horas reales desde el último
+    decaimiento (el intervalo configurado si nunca se decayó). Retorna el factor aplicado
+    (1.0 si otra ejecución simultánea ya decayó).
+    """
+    ahora = ahora or datetime.utcnow()
+    anterior = _decaida_at()
+    if horas is None:
+        if anterior is None:
+            horas = _cfg('TENDENCIA_INTERVALO_HORAS', 1)
+        else:
+            horas = max((ahora - anterior).total_seconds() / 3600.0, 0.0)
+    if not _marcar_decaimiento(anterior, ahora):
+        db.session.rollback()
+        return 1.0
+    factor = factor_decaimiento(horas)
+    db.session.execute(update(Presupuesto).values(hot_score=Presupuesto.hot_score * factor))
+    db.session.commit()
+    return factor
+
+
+def recalcular(ahora=None):
+    """
+    Reconstruye hot_score desde el historial (votos, comentarios y fecha de alta),
+    aplicando a cada evento el decaimiento correspondiente a su antigüedad.
+    Se usa al migrar BD antiguas y desde `flask tendencia-recalcular`.
+    """
+    ahora = ahora or datetime.utcnow()
+
+    def decaido(peso, fecha):
+        if fecha is None:
+            return peso
+        horas = max((ahora - fecha).total_seconds() / 3600.0, 0.0)
+        return peso * factor_decaimiento(horas)
+
+    puntuaciones = {}
+    for pid, fecha_registro in db.session.query(Presupuesto.id, Presupuesto.fecha_registro):
+        puntuaciones[pid] = decaido(peso_inicial(), fecha_registro)
+    for pid, tipo, fecha in db.session.query(VotoPresupuesto.presupuesto_id, VotoPresupuesto.tipo, VotoPresupuesto.fecha):
+        if pid in puntuaciones:
+            puntuaciones[pid] += decaido(peso_voto(tipo), fecha)
+    peso_comentario = _cfg('TENDENCIA_PESO_COMENTARIO', 0.5)
+    for pid, fecha in db.session.query(Comentario.presupuesto_id, Comentario.fecha_creacion):
+        if pid in puntuaciones:
+            puntuaciones[pid] += decaido(peso_comentario, fecha)
+
+    if puntuaciones:
+        db.session.execute(
+            update(Presupuesto),
+            [{'id': pid, 'hot_score': round(score, 6)} for pid, score in puntuaciones.items()],
+        )
+    # Las puntuaciones quedan decaídas hasta `ahora`: el próximo decaer() parte de aquí
+    anterior = _decaida_at()
+    _marcar_decaimiento(anterior, ahora)
+    db.session.commit()
+    return len(puntuaciones)
@@ -0,0 +1,245 @@
+"""
+=============================================================================
+TIEMPO REAL (Server-Sent Events)
+Difusión de cambios de votos y comentarios al modal de detalle sin recargar.
+=============================================================================
+
+- Difusor: broadcaster en proceso. Cada cliente SSE tiene una Suscripcion con
+  búfer acotado (deque maxlen) y solo recibe eventos de los proyectos que ve.
+- Límite de conexiones simultáneas por worker (SSE_MAX_CONEXIONES) y heartbeat
+  (comentario ': ping') para mantener vivas las conexiones a través de proxies.
+- Modo 'sqlite' (varios workers): las rutas escriben el evento en una BD local
+  (SSE_STORE_PATH) y un hilo por worker la sondea y reenvía al difusor local.
+  En modo 'local' (un solo proceso) el evento va directo al difusor.
+
+Las rutas de voto y comentario llaman a publicar_voto() / publicar_comentario()
+después del commit.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import count
+
+
+class Suscripcion:
+    """Cliente SSE conectado: proyectos que observa y búfer acotado de eventos pendientes."""
+
+    def __init__(self, ids, max_buffer):
+        self.ids = frozenset(ids)
+        self.buffer = deque(maxlen=max_buffer)
+        self.cond = threading.Condition()
+
+    def entregar(self, evento):
+        """Encola un evento; si el cliente va lento se descartan los más antiguos."""
+        with self.cond:
+            self.buffer.append(evento)
+            self.cond.notify()
+
+    def esperar(self, timeout):
+        """Bloquea hasta timeout segundos; retorna la lista de eventos pendientes (vacía si no hubo)."""
+        with self.cond:
+            if not self.buffer:
+                self.cond.wait(timeout)
+            eventos = list(self.buffer)
+            self.buffer.clear()
+        return eventos
+
+
+class Difusor:
+    """Broadcaster en proceso: reparte cada evento a las suscripciones del proyecto afectado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._secuencia = count(1)
+        self.max_conexiones = 200
+        self.max_buffer = 50
+
+    @property
+    def conexiones(self):
+        return len(self._suscripciones)
+
+    def suscribir(self, ids):
+        """Registra un cliente. Retorna None si se alcanzó el límite de conexiones."""
+        with self._lock:
+            if len(self._suscripciones) >= self.max_conexiones:
+                return None
+            s = Suscripcion(ids, self.max_buffer)
+            self._suscripciones.add(s)
+            return s
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def difundir(self, tipo, presupuesto_id, datos):
+        """Entrega el evento a los clientes que observan presupuesto_id."""
+        evento = (next(self._secuencia), tipo, datos)
+        with self._lock:
+            destinos = [s for s in self._suscripciones if presupuesto_id in s.ids]
+        for s in destinos:
+            s.entregar(evento)
+
+
+class AlmacenEventos:
+    """
+    BD SQLite local compartida por los workers de la misma máquina (modo 'sqlite').
+    Cada worker sondea filas con id mayor al último visto y las reenvía a su difusor.
+    """
+
+    def __init__(self, path, retencion_segundos=300):
+        self.path = path
+        self.retencion = retencion_segundos
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS eventos ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' presupuesto_id INTEGER NOT NULL,'
+                ' tipo TEXT NOT NULL,'
+                ' datos TEXT NOT NULL,'
+                ' creado REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_eventos_creado ON eventos (creado)')
+
+    def _conectar(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def guardar(self, tipo, presupuesto_id, datos):
+        ahora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                'INSERT INTO eventos (presupuesto_id, tipo, datos, creado) VALUES (?, ?, ?, ?)',
+                (presupuesto_id, tipo, json.dumps(datos, separators=(',', ':')), ahora),
+            )
+            conn.execute('DELETE FROM eventos WHERE creado < ?', (ahora - self.retencion,))
+
+    def ultimo_id(self):
+        with self._conectar() as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM eventos').fetchone()[0]
+
+    def leer_desde(self, ultimo):
+        with self._conectar() as conn:
+            return conn.execute(
+                'SELECT id, presupuesto_id, tipo, datos FROM eventos WHERE id > ? ORDER BY id',
+                (ultimo,),
+            ).fetchall()
+
+
+difusor = Difusor()
+_estado = {'modo': 'local', 'almacen': None, 'hilo': None, 'intervalo': 0.5, 'logger': None}
+_hilo_lock = threading.Lock()
+
+
+def init_app(app):
+    """Configura el difusor y, en modo 'sqlite', el almacén compartido entre workers."""
+    difusor.max_conexiones = app.config.get('SSE_MAX_CONEXIONES', 200)
+    difusor.max_buffer = app.config.get('SSE_MAX_BUFFER', 50)
+    _estado['modo'] = app.config.get('SSE_MODO', 'local')
+    _estado['intervalo'] = app.config.get('SSE_POLL_SEGUNDOS', 0.5)
+    _estado['logger'] = app.logger
+    if _estado['modo'] == 'sqlite':
+        _estado['almacen'] = AlmacenEventos(app.config['SSE_STORE_PATH'])
+
+
+def _sondear(almacen, intervalo):
+    """
+    Hilo del worker: reenvía al difusor local los eventos escritos por cualquier worker.
+    Ningún error (BD bloqueada, evento corrupto) termina el hilo: se reintenta en la siguiente vuelta.
+    """
+    ultimo = None
+    while True:
+        try:
+            if ultimo is None or difusor.conexiones == 0:
+                # Al arrancar, o sin clientes en este worker: saltar los eventos en lugar de acumularlos
+                ultimo = almacen.ultimo_id()
+            else:
+                for eid, presupuesto_id, tipo, datos in almacen.leer_desde(ultimo):
+                    # Avanzar antes de difundir: un evento inválido no se reintenta para siempre
+                    ultimo = eid
+                    difusor.difundir(tipo, presupuesto_id, json.loads(datos))
+        except sqlite3.Error:
+            pass
+        except Exception:
+            _estado['logger'].exception('[sse-sondeo] Error al reenviar eventos')
+        time.sleep(intervalo)
+
+
+def _asegurar_sondeo():
+    """Arranca (una vez por proceso) el hilo de sondeo del almacén compartido."""
+    almacen = _estado['almacen']
+    if almacen is None or _estado['hilo'] is not None:
+        return
+    with _hilo_lock:
+        if _estado['hilo'] is None:
+            hilo = threading.Thread(target=_sondear, args=(almacen, _estado['intervalo']), daemon=True, name='sse-sondeo')
+            hilo.start()
+            _estado['hilo'] = hilo
+
+
+def publicar(tipo, presupuesto_id, datos):
+    """Publica un evento: directo al difusor (local) o al almacén compartido (sqlite)."""
+    almacen = _estado['almacen']
+    if almacen is not None:
+        try:
+            almacen.guardar(tipo, presupuesto_id, datos)
+        except sqlite3.Error:
+            pass
+    else:
+        difusor.difundir(tipo, presupuesto_id, datos)
+
+
+def publicar_voto(presupuesto):
+    """Delta compacto de contadores tras un like/dislike."""
+    publicar('voto', presupuesto.id, {'id': presupuesto.id, 'likes': presupuesto.likes, 'dislikes': presupuesto.dislikes})
+
+
+def publicar_comentario(comentario):
+    """Comentario nuevo para añadir a la lista del modal."""
+    publicar('comentario', comentario.presupuesto_id, {
+        'presupuesto_id': comentario.presupuesto_id,
+        'id': comentario.id,
+        'autor': comentario.autor,
+        'contenido': comentario.contenido,
+        'fecha': comentario.fecha_creacion.isoformat() if comentario.fecha_creacion else '',
+    })
+
+
+def publicar_comentario_eliminado(presupuesto_id, comentario_id):
+    publicar('comentario_eliminado', presupuesto_id, {'presupuesto_id': presupuesto_id, 'id': comentario_id})
+
+
+def publicar_comentarios_eliminados(presupuesto_id, comentario_ids):
+    """Moderación en lote: un solo evento por proyecto con todos los ids borrados."""
+    publicar('comentario_eliminado', presupuesto_id, {'presupuesto_id': presupuesto_id, 'ids': list(comentario_ids)})
+
+
+def suscribir(ids):
+    """Registra un cliente SSE (None si se alcanzó el límite de conexiones)."""
+    _asegurar_sondeo()
+    return difusor.suscribir(ids)
+
+
+def flujo(suscripcion, heartbeat=15, duracion_max=300):
+    """
+    Generador text/event-stream para una suscripción. Envía heartbeat cada
+    `heartbeat` segundos sin eventos y cierra tras `duracion_max` segundos
+    (EventSource reconecta solo) para que los workers no queden ocupados indefinidamente.
+    """
+    fin = time.monotonic() + duracion_max
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < fin:
+            eventos = suscripcion.esperar(heartbeat)
+            if not eventos:
+                yield ': ping\n\n'
+                continue
+            for eid, tipo, datos in eventos:
+                yield f'id: {eid}\nevent: {tipo}\ndata: {json.dumps(datos, separators=(",", ":"))}\n\n'
+    finally:
+        difusor.desuscribir(suscripcion)